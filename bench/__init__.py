@@ -0,0 +1,30 @@
+"""
+Benchmarks for meta.py and the structures package. From the repository root run all of them with
+
+    python -m bench [-n NUMBER] [-o results.json] [--compare baseline.json]
+
+or a single module, e.g. python -m bench.bench_init
+
+Each module has a run(number) giving {label: value}, times are the best of 5
+timeit repeats in seconds per call (sizes are in bytes). Saved results are
+plain JSON, --compare prints new/old ratios against an earlier file.
+"""
+import os
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def timecases(cases, number, repeat=5):
+    return {label: min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+            for label, stmt in cases}
+
+
+def report(results):
+    for label, value in results.items():
+        if label.endswith('(bytes)'):
+            print('%-40s %10d bytes' % (label, value))
+        elif value > 1e-3:
+            print('%-40s %10.3f ms' % (label, value * 1e3))
+        else:
+            print('%-40s %10.3f us/call' % (label, value * 1e6))
@@ -0,0 +1,54 @@
+import argparse
+import datetime
+import json
+import platform
+import sys
+
+from bench import report
+from bench import bench_attr, bench_class, bench_debug, bench_import, bench_init, bench_pack
+
+MODULES = [bench_import, bench_class, bench_init, bench_attr, bench_debug, bench_pack]
+
+
+def compare(results, baseline):
+    for module, cases in results.items():
+        print(module)
+        for label, value in cases.items():
+            old = baseline.get(module, {}).get(label)
+            if old:
+                print('    %-40s %6.2fx' % (label, value / old))
+            else:
+                print('    %-40s %7s' % (label, 'new'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Benchmarks for meta.py')
+    parser.add_argument('-n', '--number', type=int, default=200000, help='calls per timing')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to compare against')
+    parser.add_argument('modules', nargs='*', help='only run these, e.g. bench_init')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module in MODULES:
+        name = module.__name__.rpartition('.')[2]
+        if args.modules and name not in args.modules:
+            continue
+        print(name)
+        results[name] = module.run(args.number)
+        report(results[name])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version,
+                       'platform': platform.platform(),
+                       'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                       'number': args.number,
+                       'results': results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Attribute get/set through the Typed/Positive descriptors, against a plain attribute.
+
+    python -m bench.bench_attr [number]
+"""
+import sys
+
+from bench import report, timecases
+from bench.bench_init import Plain, SlotStock, Stock
+
+plain = Plain('GOOG', 100, 490.1)
+stock = Stock('GOOG', 100, 490.1)
+slot_stock = SlotStock('GOOG', 100, 490.1)
+
+
+def set_shares(obj):
+    def stmt():
+        obj.shares = 75
+    return stmt
+
+
+CASES = [
+    ('get plain', lambda: plain.shares),
+    ('get Stock.shares', lambda: stock.shares),
+    ('get Stock.shares slots', lambda: slot_stock.shares),
+    ('set plain', set_shares(plain)),
+    ('set Stock.shares', set_shares(stock)),
+    ('set Stock.shares slots', set_shares(slot_stock)),
+]
+
+
+def run(number=200000):
+    return timecases(CASES, number)
+
+
+if __name__ == '__main__':
+    report(run(*(int(arg) for arg in sys.argv[1:2])))
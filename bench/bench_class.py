@@ -0,0 +1,58 @@
+"""
+Class creation: Structure subclasses and descriptor classes, with and without the code caches.
+
+    python -m bench.bench_class [number]
+"""
+import sys
+
+import structures
+from bench import report, timecases
+from structures import core
+
+
+def make_structure():
+    class Stock(structures.Structure):
+        name = structures.String()
+        shares = structures.PositiveInteger()
+        price = structures.PositiveFloat(default=0.0)
+    return Stock
+
+
+def make_slot_structure():
+    class Stock(structures.Structure, slots=True):
+        name = structures.String()
+        shares = structures.PositiveInteger()
+        price = structures.PositiveFloat(default=0.0)
+    return Stock
+
+
+def make_descriptor():
+    class PositiveNumber(structures.Typed, structures.Positive):
+        ty = (int, float)
+    return PositiveNumber
+
+
+def cold(make):
+    def stmt():
+        core._code_cache.clear()
+        core._signature_cache.clear()
+        return make()
+    return stmt
+
+
+CASES = [
+    ('Structure subclass', make_structure),
+    ('Structure subclass, cold caches', cold(make_structure)),
+    ('Structure subclass slots', make_slot_structure),
+    ('Descriptor subclass', make_descriptor),
+    ('Descriptor subclass, cold caches', cold(make_descriptor)),
+]
+
+
+def run(number=200000):
+    # Classes are a lot slower to make than instances
+    return timecases(CASES, max(1, number // 100))
+
+
+if __name__ == '__main__':
+    report(run(*(int(arg) for arg in sys.argv[1:2])))
@@ -0,0 +1,45 @@
+"""
+Call overhead of the debug and timed decorators.
+
+    python -m bench.bench_debug [number]
+"""
+import sys
+
+import structures
+from bench import report, timecases
+from structures import debugging
+
+
+def add(x, y):
+    return x + y
+
+
+def decorated():
+    saved = debugging.debug_enabled, debugging.debug_sink
+    try:
+        structures.set_debug(False)
+        off = structures.debug(add)
+        structures.set_debug(True, sink=lambda msg: None)
+        on = structures.debug(add)
+        sampled = structures.debug(add, every=100)
+        limited = structures.debug(add, rate=10)
+    finally:
+        debugging.debug_enabled, debugging.debug_sink = saved
+    return off, on, sampled, limited
+
+
+def run(number=200000):
+    off, on, sampled, limited = decorated()
+    timed = structures.timed(add)
+    return timecases([
+        ('plain function', lambda: add(2, 3)),
+        ('debug, off', lambda: off(2, 3)),
+        ('debug, on', lambda: on(2, 3)),
+        ('debug, every=100', lambda: sampled(2, 3)),
+        ('debug, rate=10', lambda: limited(2, 3)),
+        ('timed', lambda: timed(2, 3)),
+    ], number)
+
+
+if __name__ == '__main__':
+    report(run(*(int(arg) for arg in sys.argv[1:2])))
@@ -0,0 +1,42 @@
+"""
+Import time of meta.py and the structures package, each in a fresh interpreter minus the
+interpreter start up.
+
+    python -m bench.bench_import [number]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import ROOT, report
+
+
+def _spawn(code, number, env=None):
+    best = float('inf')
+    for _ in range(number):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(number=200000):
+    # number is meant for in-process loops, a handful of processes is plenty here
+    number = max(3, min(number // 10000, 20))
+    startup = _spawn('pass', number)
+    results = {'import meta': _spawn('import meta', number) - startup,
+               'import structures': _spawn('import structures', number) - startup,
+               'import structures, load core': _spawn('import structures; structures.Structure',
+                                                      number) - startup}
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(os.environ, META_CODE_CACHE=cache)
+        _spawn('import meta', 1, env) # Fill the cache
+        results['import meta, warm code cache'] = _spawn('import meta', number, env) - startup
+    return results
+
+
+if __name__ == '__main__':
+    report(run(*(int(arg) for arg in sys.argv[1:2])))
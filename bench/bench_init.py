@@ -0,0 +1,69 @@
+"""
+Construction throughput: generated __init__ vs the sig.bind() path and trusted(), and per
+instance size.
+
+    python -m bench.bench_init [number]
+"""
+import sys
+
+import structures
+from bench import report, timecases
+
+
+class Plain:
+    def __init__(self, name, shares, price):
+        self.name = name
+        self.shares = shares
+        self.price = price
+
+
+class Stock(structures.Structure):
+    name = structures.String()
+    shares = structures.PositiveInteger()
+    price = structures.PositiveFloat()
+
+
+class BindStock(structures.Structure):
+    name = structures.String()
+    shares = structures.PositiveInteger()
+    price = structures.PositiveFloat()
+
+    def __init__(self, *args, **kwargs):
+        # Hand written __init__, so Structmeta leaves it alone
+        structures.Structure.__init__(self, *args, **kwargs)
+
+
+class SlotStock(structures.Structure, slots=True):
+    name = structures.String()
+    shares = structures.PositiveInteger()
+    price = structures.PositiveFloat()
+
+
+CASES = [
+    ('plain class', lambda: Plain('GOOG', 100, 490.1)),
+    ('sig.bind()', lambda: BindStock('GOOG', 100, 490.1)),
+    ('generated __init__', lambda: Stock('GOOG', 100, 490.1)),
+    ('generated __init__ slots', lambda: SlotStock('GOOG', 100, 490.1)),
+    ('trusted()', lambda: Stock.trusted('GOOG', 100, 490.1)),
+    ('trusted() slots', lambda: SlotStock.trusted('GOOG', 100, 490.1)),
+    ('sig.bind() kwargs', lambda: BindStock('GOOG', shares=100, price=490.1)),
+    ('generated __init__ kwargs', lambda: Stock('GOOG', shares=100, price=490.1)),
+]
+
+
+def sizeof(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def run(number=200000):
+    results = timecases(CASES, number)
+    results['Stock size, dict (bytes)'] = sizeof(Stock('GOOG', 100, 490.1))
+    results['Stock size, slots (bytes)'] = sizeof(SlotStock('GOOG', 100, 490.1))
+    return results
+
+
+if __name__ == '__main__':
+    report(run(*(int(arg) for arg in sys.argv[1:2])))
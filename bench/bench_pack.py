@@ -0,0 +1,40 @@
+"""
+One Stock record to bytes and back, packed against a JSON round trip.
+
+    python -m bench.bench_pack [number]
+"""
+import json
+import sys
+
+import structures
+from bench import report, timecases
+
+
+class Stock(structures.Structure):
+    name = structures.SizedString(maxlen=8)
+    shares = structures.PositiveInteger()
+    price = structures.PositiveFloat()
+
+
+stock = Stock('GOOG', 100, 490.1)
+packed = stock.to_bytes()
+text = json.dumps(vars(stock))
+
+CASES = [
+    ('json.dumps(vars(s))', lambda: json.dumps(vars(stock))),
+    ('s.to_bytes()', stock.to_bytes),
+    ('Stock(**json.loads(...))', lambda: Stock(**json.loads(text))),
+    ('Stock.from_bytes(...)', lambda: Stock.from_bytes(packed)),
+    ('Stock.unpack_many(...) 1 record', lambda: Stock.unpack_many(packed)),
+]
+
+
+def run(number=200000):
+    results = timecases(CASES, number)
+    results['record size, json (bytes)'] = len(text)
+    results['record size, packed (bytes)'] = len(packed)
+    return results
+
+
+if __name__ == '__main__':
+    report(run(*(int(arg) for arg in sys.argv[1:2])))
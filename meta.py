@@ -1303,105 +1303,389 @@ The problem with all of this is performance....
     - Multiple inheritance/super in descriptors
 """
 
-print('Performance')
-
-
-from collections import OrderedDict
-from inspect import Parameter, Signature
-
-class NoDupOrderedDict(OrderedDict):
-    def __setitem__(self, key, value):
-        if key in self:
-            raise NameError('%s already defined'
-                             % key)
-        super().__setitem__(key, value)
-        
-class Structmeta(type):
-    
-    @classmethod
-    def __prepare__(cls, name, bases):
-        return NoDupOrderedDict()
-
-    def __new__(cls, name, bases, clsdict):
-        fields = [key for key, val in clsdict.items()
-                 if isinstance(val, Descriptor)]
-        for name in fields:
-            clsdict[name].name = name
 
-        clsobj = super().__new__(cls, name, bases, dict(clsdict)) # (1)
-        sig = make_signature(fields)
-        setattr(clsobj, '__signature__', sig)
-        return clsobj
+print('Performance')
 
-def _make_init(fields):
-    '''
-    Give a list of fields names, mane an __init__ method
-    '''
-    code = 'def __init__(self, %s):\n' % \
-            ','.join(fields)
-    for name in fields:
-        code += '       self.%s = %s\n' % (name, name)
-    return code 
+"""
+Signature enforcement is the first one to go: every instance goes through sig.bind() and then a
+setattr() loop, that is generic work repeated on every single construction.
+The metaclass already knows the fields at definition time, so it can write the __init__ as text
+and exec() it once per class:
 
-class Descriptor:
-    
-    def __init__(self, name=None):
+    def __init__(self, name, shares, price):
         self.name = name
-    #this is no neccesary    
-    def __get__(self, instance, cls):
-        # instance: is the instance being manipulated
-        # e.g. Stock instance
-        print('Get', self.name)
-        return instance.__dict__[self.name]
-    
-    def __set__(self, instance, value):
-        print('Set', self.name, value)
-        instance.__dict__[self.name] = value
+        self.shares = shares
+        self.price = price
 
-    def __delete__(self, instance):
-        print('Delete', self.name)
-        del instance.__dict__[self.name]
+Descriptors can also carry a default, which ends up as a plain keyword default in that code.
+"""
 
-def make_signature(names):
-    return Signature(
-            Parameter(name,
-                Parameter.POSITIONAL_OR_KEYWORD)
-            for name in names
-            )
+# From here on the code lives in the structures package (structures/core.py), so it can be
+# imported without running this whole walk-through.
+from structures import (Structmeta, Structure, Descriptor, Typed, Integer, Float, String,
+                        Positive, PositiveInteger, PositiveFloat, set_code_cache)
 
-class Structure(metaclass=Structmeta):
-    _fields = []
-    def __init__(self, *args, **kwargs):
-        bound = self.__signature__.bind(*args, **kwargs)
-        for name, val in bound.arguments.items():
-            setattr(self, name, val)
+"""
+Second bottleneck: PositiveInteger.__set__ walks Typed -> Positive -> Descriptor through super(),
+one Python call per hop. Instead each descriptor class only says which lines it adds,
 
-class Typed(Descriptor):
-    ty = object # Expected type
-    def __set__(self, instance, value):
-        if not isinstance(value, self.ty):
-            raise TypeError("Expected %s" % self.ty)
-        super().__set__(instance, value)
+    class Positive(Descriptor):
+        @staticmethod
+        def set_code():
+            return ['if value < 0:',
+                    '    raise ValueError("Must be >= 0")']
 
-class Integer(Typed):
-    ty = int
-class Float(Typed):
-    ty = float
-class String(Typed):
-    ty = str
+and a metaclass on Descriptor glues the set_code() of the whole MRO into a single __set__:
 
-class Positive(Descriptor):
     def __set__(self, instance, value):
+        if not _isinstance(value, self.ty):
+            raise TypeError("Expected %s" % self.ty)
         if value < 0:
-            raise ValueError('Must be >= 0')
-        super().__set__(instance, value)
+            raise ValueError("Must be >= 0")
+        instance.__dict__[self.name] = value
 
-class PositiveInteger(Integer, Positive):
-    pass
-class PositiveFloat(Float, Positive):
-    pass
+The same lines get pasted straight into the generated Structure __init__, so construction
+doesn't call the descriptors at all. That's why the checks call builtins as _isinstance, _len
+and so on: a field named len is a local of that __init__ and would hide the builtin.
+"""
 
 class Stock(Structure):
     name = String()
     shares = PositiveInteger()
     price = PositiveFloat()
+
+class Point(Structure):
+    x = Float()
+    y = Float()
+
+class Address(Structure):
+    hostname = String()
+    port = PositiveInteger()
+
+"""
+>>> import inspect
+>>> print(inspect.signature(Stock))
+(name, shares, price)
+>>> s = Stock('GOOG', 100, price=490.1)
+>>> s.shares
+100
+>>> s = Stock('GOOG', 100)
+Traceback (most recent call last):
+File "<stdin>", line 1, in <module>
+TypeError: Stock.__init__() missing 1 required positional argument: 'price'
+
+With a default:
+    class Address(Structure):
+        hostname = String()
+        port = PositiveInteger(default=80)
+>>> Address('localhost').port
+80
+
+Construction is now a single function call with the checks inlined and s.shares = 10 is a single
+__set__ call, python -m bench.bench_init compares it against the sig.bind() path.
+
+All that code only depends on the layout (field names, descriptor classes, defaults, slots), so
+it's compiled once per layout and shared. Short lived processes can also keep it on disk, the
+same way __pycache__ does for modules:
+
+    $ META_CODE_CACHE=~/.cache/structures python worker.py
+
+or set_code_cache(path) before defining the classes.
+"""
+
+"""
+Last one is memory, every instance carries a full __dict__ for three values. Asking for slots=True
+makes Structmeta derive __slots__ from the fields and the descriptors store into _<field> instead:
+
+    class Stock(Structure, slots=True):
+        name = String()
+        shares = PositiveInteger()
+        price = PositiveFloat()
+
+>>> s = Stock('GOOG', 100, 490.1)
+>>> s.__dict__
+Traceback (most recent call last):
+File "<stdin>", line 1, in <module>
+AttributeError: 'Stock' object has no attribute '__dict__'
+>>> import sys
+>>> sys.getsizeof(s)
+56
+>>> s.spam = 1
+Traceback (most recent call last):
+File "<stdin>", line 1, in <module>
+AttributeError: 'Stock' object has no attribute 'spam'
+
+It's not free: every read and write goes through one more call to get at the slot than at
+__dict__, roughly 1.2-1.5x slower per access (python -m bench bench_attr). Worth it when there
+are millions of instances.
+"""
+
+print('Frozen records')
+
+"""
+Points and addresses are values, once built they shouldn't change. frozen=True still validates
+everything in __init__, but the descriptors refuse any later assignment and the class gets a
+generated __eq__ and __hash__ over its fields, so instances work as dict keys and in sets.
+intern=True adds a table to share one instance between equal records, from_rows() goes
+through it and Point.intern(p) does it by hand:
+
+    class Point(Structure, frozen=True, intern=True):
+        x = Float()
+        y = Float()
+
+>>> p = Point(2.0, 3.0)
+>>> p.x = 4.0
+Traceback (most recent call last):
+...
+AttributeError: can't set frozen field 'x'
+>>> p == Point(2.0, 3.0), p is Point(2.0, 3.0)
+(True, False)
+>>> a, b = Point.from_rows([(2.0, 3.0), (2.0, 3.0)])
+>>> a is b
+True
+"""
+
+print('More checks')
+
+"""
+Adding a check is just another class with a set_code() (and a column_code() for StructureArray),
+with its settings as keyword arguments. They're looked up on the descriptor, so a regex gets
+compiled once per field and OneOf keeps a frozenset:
+
+    class Stock(Structure):
+        name = SizedRegexString(maxlen=8, pat='[A-Z]+$')
+        shares = RangeInteger(low=0, high=1000000)
+        price = PositiveFloat()
+        exchange = OneOf(choices=['NYSE', 'NASDAQ'], default='NYSE')
+
+>>> Stock('goog', 100, 490.1)
+Traceback (most recent call last):
+...
+ValueError: Invalid string, must match '[A-Z]+$'
+
+SizedRegexString(String, Sized, Regex) has no code of its own, its __set__ is still one function
+with the three checks one after the other.
+"""
+
+from structures import (Sized, Regex, Range, OneOf, SizedString, SizedRegexString, RangeInteger,
+                        RangeFloat)
+
+print('Columns')
+
+"""
+A million Stock objects still means a million __init__ calls. The fields Structmeta collects
+(they end up in _fields) are enough to describe a NumPy structured array instead, one column
+per field, and every descriptor class gets a check_column() glued together from column_code()
+the same way __set__ is glued from set_code(), so whole columns are validated at once:
+
+>>> stocks = StructureArray[Stock].from_columns(name=['GOOG', 'AAPL'],
+...                                             shares=[100, 50],
+...                                             price=[490.1, 92.1])
+>>> stocks['price'].sum()
+582.2
+>>> s = stocks[1] # A Stock looking at row 1, nothing copied
+>>> s.name, s.shares
+('AAPL', 50)
+>>> s.shares = -1
+Traceback (most recent call last):
+...
+ValueError: Must be >= 0
+>>> StructureArray[Stock].from_columns(name=['GOOG'], shares=[-100], price=[490.1])
+Traceback (most recent call last):
+...
+ValueError: Must be >= 0
+"""
+
+from structures import StructureArray
+
+print('Batches')
+
+"""
+Loading a file one Stock(...) call at a time still pays a call per row and stops at the first
+bad one. Structure.from_rows() and Structure.from_csv() generate one loop per class with all the
+checks pasted in and keep going past bad rows, so the whole file gets reported in one pass:
+
+>>> Stock.from_rows([('GOOG', 100, 490.1), ('AAPL', -1, 92.1), ('IBM', 50, '91')])
+Traceback (most recent call last):
+...
+BatchError: 2 bad rows
+row 2: shares: Must be >= 0
+row 3: price: Expected <class 'float'>
+>>> errors = []
+>>> stocks = Stock.from_csv('portfolio.csv', errors) # name,shares,price header
+>>> len(stocks), len(errors)
+(7, 0)
+"""
+
+print('Trusted data')
+
+"""
+Our own snapshots were checked when they were written, checking every field again on the way
+back in is wasted. Every Structure class has a generated trusted() taking the same arguments as
+__init__ that stores the values without any check, and from_rows()/unpack_many() take
+trusted=True. Nothing is lost: validate() runs the checks on one instance later, validate_all()
+on a whole batch, reporting bad ones like from_rows() does (it only reads, so a worker thread
+can do it while the main thread gets on with the data):
+
+>>> s = Stock.trusted('GOOG', -100, 490.1) # About the speed of a plain class
+>>> s.validate()
+Traceback (most recent call last):
+...
+ValueError: Must be >= 0
+>>> stocks = Stock.unpack_many(snapshot, trusted=True)
+>>> checked = executor.submit(Stock.validate_all, stocks)
+"""
+
+print('Bulk updates')
+
+"""
+Repricing everything is the same story as loading: a million s.price = ... assignments are a
+million __set__ calls. Every descriptor has set_many() that checks all the values first (as one
+column when they come as a NumPy array) and then writes them, nothing is written if one fails:
+
+>>> Stock.price.set_many(stocks, new_prices)
+"""
+
+print('Packing')
+
+"""
+Shipping Stocks between processes as JSON builds a dict per record and then checks every field
+again on the way in. With fixed width fields the records can be packed with struct instead: the
+ordered fields give the layout, Integer packs as 'q', Float as 'd' and a String needs a maxlen,
+which is its width in bytes. to_bytes()/from_bytes() do one record, pack_many()/unpack_many() a
+whole buffer, unpacked through a memoryview and checked with the same loop as from_rows():
+
+    class Stock(Structure):
+        name = SizedString(maxlen=8)
+        shares = PositiveInteger()
+        price = PositiveFloat()
+
+>>> Stock('GOOG', 100, 490.1).to_bytes()
+b'GOOG\\x00\\x00\\x00\\x00d\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x9a\\x99\\x99\\x99\\x99\\xa1~@'
+>>> data = Stock.pack_many(stocks) # One bytearray, 24 bytes a record
+>>> [vars(s) for s in Stock.unpack_many(data)] == [vars(s) for s in stocks]
+True
+"""
+
+print('Record files')
+
+"""
+Packed records have a fixed width, so a file of them doesn't have to be read to be used:
+record n starts at n * size. write_records() writes a header with the fields and their formats
+and then the records, RecordFile maps the file read only. Several processes opening the same
+multi-GB history share the pages the OS caches instead of each holding its own copy:
+
+>>> write_records('history.rec', Stock, stocks)
+>>> history = RecordFile('history.rec', Stock) # TypeError if the fields don't match
+>>> history[1000].price # A Stock, reading and checking price from the file
+490.1
+>>> history['shares'] # NumPy view over the file, no copy and no checks
+array([100, 50, ...])
+>>> history.load(0, 10) # Real, checked Stock instances
+"""
+
+from structures import RecordFile, write_records
+
+print('Shared memory')
+
+"""
+Handing a million Stocks to a process pool pickles every one of them, __dict__ and all, and the
+workers build them all again. The records layout works in any buffer, so put it in shared memory
+once: SharedRecords.create() packs a batch into a block named after the schema, and pickling it
+only sends that name, each worker attaches to the same block and checks the fields match:
+
+    def total(records):
+        with records:
+            return int(records['shares'].sum())
+
+>>> records = SharedRecords.create(Stock, stocks)
+>>> with Pool() as pool:
+...     pool.map(total, [records] * 4)
+>>> records.close()
+>>> records.unlink() # Whoever created it frees it
+"""
+
+from structures import SharedRecords
+
+print('Debugging in production')
+
+"""
+Everything decorated with debug pays an extra frame and a print() on every call, forever, and
+with debugmeta that's the whole hierarchy. Better to decide once, when decorating: if debugging
+is off the decorators hand back the very same function (or class), so there's nothing left to pay.
+If it's on, messages go to a sink (any callable taking a string, logging by default) and not
+to stdout.
+
+    $ META_DEBUG=1 python app.py
+
+or from code, before the classes get defined:
+
+>>> set_debug(True, sink=print)
+>>> @debug(prefix='***')
+... def add(x, y):
+...     return x + y
+>>> add(2, 3)
+***add
+5
+>>> set_debug(False)
+>>> @debug
+... def sub(x, y):
+...     return x - y
+>>> hasattr(sub, '__wrapped__') # The function itself, not a wrapper
+False
+
+Under load even a sink is too much, so debug() and debugmethods() can also sample: every=N traces
+1 call in N and rate=K at most K calls per second (for each decorated function). Pair that with
+a TraceBuffer sink and the calls only ever append to a ring in memory, a thread writes it out:
+
+>>> set_debug(True, sink=TraceBuffer('trace.log'))
+>>> @debugmethods(every=100, rate=10)
+... class Spam:
+...     def grok(self):
+...         pass
+>>> class Base(metaclass=debugmeta, rate=50): # The whole hierarchy
+...     pass
+
+debugattr gets the same treatment. Replacing __getattribute__ made every attribute lookup, methods
+included, go through a Python function. Now only the fields get a small descriptor each, set up
+once when decorating, and undebugattr() takes them off again:
+
+>>> @debugattr(fields=['x', 'y'], every=10)
+... class Point:
+...     def __init__(self, x, y):
+...         self.x = x
+...         self.y = y
+>>> p = Point(2, 3)
+>>> p.x
+Get: x
+2
+>>> undebugattr(Point) # Structure classes don't need fields=, their _fields are used
+"""
+
+from structures import (set_debug, debug, debugmethods, debugmeta, debugattr, undebugattr,
+                        TraceBuffer)
+
+print('Profiling')
+
+"""
+Same trick, different wrapper: instead of printing, time the call. timed records the latency of
+every call with perf_counter_ns() into a per-qualname histogram (powers of two, so percentiles are
+good within a factor 2, max is exact), timedmethods does a whole class and profilemeta a whole
+hierarchy, exactly like debugmethods and debugmeta.
+
+>>> class Base(metaclass=profilemeta):
+...     pass
+>>> class Spam(Base):
+...     def grok(self):
+...         pass
+>>> for _ in range(1000):
+...     Spam().grok()
+>>> timings('Spam.')
+{'Spam.grok': {'count': 1000, 'mean': 188.6, 'p50': 255, 'p99': 511, 'max': 9541}}
+>>> dump_timings(print)
+Spam.grok                                   1000 calls  p50       255ns  p99       511ns  max      9541ns
+>>> stop = dump_timings_every(60, print) # From a background thread, stop.set() to end it
+"""
+
+from structures import (timed, timedmethods, profilemeta, timings, reset_timings, dump_timings,
+                        dump_timings_every)
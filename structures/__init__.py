@@ -0,0 +1,37 @@
+"""
+The final Structmeta/Structure/Descriptor stack from meta.py, plus the debug
+and profiling helpers, without the walk-through around them.
+
+Importing the package has no side effects and loads none of the submodules,
+each name is imported from its submodule the first time it's used.
+"""
+import importlib
+
+_exports = {
+    'core': ['BatchError', 'Descriptor', 'DescriptorMeta', 'Float', 'Integer',
+             'NoDupOrderedDict', 'OneOf', 'Positive', 'PositiveFloat', 'PositiveInteger',
+             'Range', 'RangeFloat', 'RangeInteger', 'Regex', 'RowError', 'Sized',
+             'SizedRegexString', 'SizedString', 'String', 'Structmeta', 'Structure',
+             'Typed', 'make_signature', 'set_code_cache'],
+    'columns': ['StructureArray'],
+    'debugging': ['TraceBuffer', 'debug', 'debugattr', 'debugmeta', 'debugmethods',
+                  'set_debug', 'undebugattr'],
+    'records': ['RecordFile', 'Records', 'write_records'],
+    'shared': ['SharedRecords'],
+    'profiling': ['LatencyStats', 'dump_timings', 'dump_timings_every', 'profilemeta',
+                  'reset_timings', 'timed', 'timedmethods', 'timings'],
+}
+_modules = {name: module for module, names in _exports.items() for name in names}
+
+__all__ = sorted(_modules)
+
+def __getattr__(name):
+    module = _modules.get(name)
+    if module is None:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
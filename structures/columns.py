@@ -0,0 +1,117 @@
+"""
+StructureArray, Structure records stored column-wise in a NumPy structured array.
+"""
+from .core import _MISSING, _view_methods
+
+try:
+    import numpy as np
+except ImportError: # Only needed by StructureArray
+    np = None
+
+class _RowField:
+    # Stands in for a field descriptor on row views, reads and writes the array
+    writable = True # See Descriptor.set_many()
+    def __init__(self, desc):
+        self.desc = desc
+        self.name = desc.name
+
+    def __get__(self, view, cls):
+        if view is None:
+            return self
+        return view._data[self.name].item(view._index)
+
+    def __set__(self, view, value):
+        if self.desc._frozen:
+            raise AttributeError("can't set frozen field %r" % self.name)
+        self.desc.check(value)
+        view._data[self.name][view._index] = value
+
+class StructureArray:
+    '''
+    Records of a Structure class stored column-wise in a NumPy structured array.
+    StructureArray[Stock] is the array type holding Stock records.
+    '''
+    structure = None
+    _types = {}
+
+    def __class_getitem__(cls, structure):
+        if np is None:
+            raise ImportError('StructureArray needs numpy')
+        if structure not in cls._types:
+            dtype = np.dtype([(name, getattr(structure, name).dtype)
+                              for name in structure._fields])
+            # Row views are Stock instances whose fields live in the array
+            view = type(structure)(structure.__name__ + 'View', (structure,),
+                                   {'__slots__': ('_data', '_index'),
+                                    '__qualname__': structure.__qualname__ + 'View',
+                                    **_view_methods(structure, structure.__qualname__ + 'View'),
+                                    **{name: _RowField(getattr(structure, name))
+                                       for name in structure._fields}})
+            cls._types[structure] = type('%s[%s]' % (cls.__name__, structure.__name__),
+                                         (cls,),
+                                         {'structure': structure, 'dtype': dtype,
+                                          '_view': view})
+        return cls._types[structure]
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def from_columns(cls, **columns):
+        structure = cls.structure
+        size = max((len(values) for values in columns.values()), default=0)
+        data = np.empty(size, dtype=cls.dtype)
+        for name in structure._fields:
+            desc = getattr(structure, name)
+            if name in columns:
+                column = columns[name]
+                if not isinstance(column, np.ndarray):
+                    # Python values stay objects until checked, asarray() would
+                    # turn 7 into '7' in a string column and 490 into 490.0
+                    column = np.asarray(column, dtype=object)
+                if not len(column):
+                    column = column.astype(desc.dtype)
+            elif desc.default is not _MISSING:
+                column = np.full(size, desc.default, dtype=desc.dtype)
+            else:
+                raise TypeError('missing column %r' % name)
+            if len(column) != size:
+                raise ValueError('column %r has %d rows, expected %d' % (name, len(column), size))
+            desc.check_column(column)
+            data[name] = column
+        unknown = columns.keys() - set(structure._fields)
+        if unknown:
+            raise TypeError('unexpected columns %s' % ', '.join(sorted(unknown)))
+        return cls(data)
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = list(rows)
+        return cls.from_columns(**{name: [row[n] for row in rows]
+                                   for n, name in enumerate(cls.structure._fields)})
+
+    def validate(self):
+        # Rerun the column checks, e.g. after writing into data directly
+        for name in self.structure._fields:
+            getattr(self.structure, name).check_column(self.data[name])
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            return self.data[index]
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self.data)
+            if not 0 <= index < len(self.data):
+                raise IndexError('row index out of range')
+            view = object.__new__(self._view)
+            object.__setattr__(view, '_data', self.data) # Frozen structures refuse plain setattr
+            object.__setattr__(view, '_index', index)
+            return view
+        return type(self)(self.data[index])
+
+    def __iter__(self):
+        for index in range(len(self.data)):
+            yield self[index]
@@ -0,0 +1,795 @@
+"""
+Structmeta, Structure and the descriptor classes, with their __init__, __set__
+and batch loading code generated per class (and cached per field layout).
+"""
+import builtins
+import os
+import sys
+from collections import OrderedDict, namedtuple
+from functools import partial
+from operator import attrgetter
+from types import FunctionType
+
+_MISSING = object() # Marks a descriptor without default
+
+class NoDupOrderedDict(OrderedDict):
+    def __setitem__(self, key, value):
+        if key in self:
+            raise NameError('%s already defined'
+                             % key)
+        super().__setitem__(key, value)
+        
+class _LazySignature:
+    # Structmeta.__signature__, made on first use since inspect is slow to import.
+    # Not a data descriptor, so a __signature__ set on a class still wins
+    def __get__(self, cls, metacls):
+        if cls is None:
+            return self
+        sig = vars(cls).get('_signature')
+        if sig is None:
+            sig = make_signature([val for val in vars(cls).values()
+                                  if isinstance(val, Descriptor)])
+            cls._signature = sig
+        return sig
+
+class Structmeta(type):
+    __signature__ = _LazySignature()
+
+    @classmethod
+    def __prepare__(cls, name, bases, **kwargs):
+        return NoDupOrderedDict()
+
+    def __new__(cls, name, bases, clsdict, slots=False, frozen=False, intern=False):
+        if intern and not frozen:
+            raise TypeError('intern=True needs frozen=True')
+        fields = [key for key, val in clsdict.items()
+                 if isinstance(val, Descriptor)]
+        for key in fields:
+            if key.startswith('_'):
+                raise TypeError('%s: field %r starts with _, those names are kept for '
+                                'the generated code' % (name, key))
+            clsdict[key].name = key
+        descriptors = [clsdict[key] for key in fields]
+
+        clsdict = dict(clsdict) # (1)
+        qualname = clsdict.get('__qualname__', name)
+        if fields:
+            clsdict['_fields'] = fields
+        if slots:
+            # The descriptors already own the field names, values go in _<field>
+            clsdict['__slots__'] = tuple(_slot_name(key) for key in fields)
+        if fields and '__init__' not in clsdict:
+            clsdict['__init__'] = _build_init(qualname, descriptors, slots)
+        if fields and 'trusted' not in clsdict:
+            # Made on first use, don't inherit the one of a base with other fields
+            clsdict['trusted'] = _make_trusted_first
+        if frozen:
+            clsdict['_frozen'] = True
+            for method in ('__eq__', '__hash__'):
+                if method not in clsdict:
+                    clsdict[method] = _build_compare(qualname, method, fields, slots)
+            if not slots:
+                # Slots already refuse new attributes, a __dict__ doesn't
+                clsdict.setdefault('__setattr__', _frozen_setattr)
+                clsdict.setdefault('__delattr__', _frozen_delattr)
+        if intern:
+            clsdict['_interned'] = {}
+        clsobj = super().__new__(cls, name, bases, clsdict)
+        if slots or frozen:
+            for desc in descriptors:
+                desc.__class__ = type(desc).variant(slots, frozen)
+                if slots:
+                    desc.slot = vars(clsobj)[_slot_name(desc.name)]
+                    desc._read_slot = attrgetter(_slot_name(desc.name))
+        return clsobj
+
+def _slot_name(name):
+    return '_' + name
+
+def _make_args(fields, defaults=()):
+    # Fields in defaults get a keyword default named _dflt_<field>
+    args = []
+    for name in fields:
+        if name in defaults:
+            args.append('%s=_dflt_%s' % (name, name))
+        elif args and '=' in args[-1]:
+            raise TypeError('non-default field %r follows default field' % name)
+        else:
+            args.append(name)
+    return ', '.join(args)
+
+# Locals the pasted set_code() lines work with, the rest of the generated
+# code only uses names starting with _ and fields can't
+_SCRATCH = ('self', 'value')
+
+def _local(name):
+    # Local holding field name, fields named like a scratch local get moved out of the way
+    return '_arg_%s' % name if name in _SCRATCH else name
+
+def _make_init(fields, defaults=(), inline=()):
+    '''
+    Give a list of fields names, make an __init__ method
+    Fields in defaults get a keyword default named _dflt_<field>
+    Fields in inline get the set_code() of their descriptor _desc_<field>
+    pasted in, instead of going through the descriptor __set__
+    '''
+    code = 'def __init__(_inst, %s):\n' % \
+            _make_args(fields, defaults)
+    for name in fields:
+        if name in _SCRATCH:
+            code += '    %s = %s\n' % (_local(name), name)
+    for name in fields:
+        if name in inline:
+            code += '    self = _desc_%s\n' % name
+            code += '    value = %s\n' % _local(name)
+            for line in inline[name]:
+                code += '    ' + line + '\n'
+        else:
+            code += '    _inst.%s = %s\n' % (name, _local(name))
+    return code 
+
+# Builtins the generated code calls, under names no field can take: a field
+# named len is a local of the generated __init__ and would hide the builtin
+_BUILTINS = {'_' + func.__name__: func
+             for func in (all, any, enumerate, isinstance, len, sorted)}
+
+_code_cache = {}
+# Part of the disk cache key, bump it whenever code generation changes (the
+# _make_* templates here and in packing.py, _store_code(), _read_code()),
+# or a cache kept across upgrades goes on loading the old code
+_CODE_VERSION = 4
+code_cache_dir = os.environ.get('META_CODE_CACHE') or None # Marshalled code on disk, off if None
+
+def set_code_cache(path):
+    '''
+    Keep generated code in directory path (None turns it off), so that later
+    processes load it instead of generating and compiling it again
+    '''
+    global code_cache_dir
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+    code_cache_dir = path
+
+def _cached_function(key, make_code, name, namespace, defaults=None):
+    '''
+    Give function name out of the code make_code() returns, with namespace as globals
+    The compiled code is kept under key (the field spec) so later classes with the
+    same layout skip codegen and compile, only globals and defaults differ
+    '''
+    # Needed once the code makes functions of its own (generator expressions)
+    namespace.setdefault('__builtins__', builtins)
+    for builtin, func in _BUILTINS.items():
+        namespace.setdefault(builtin, func)
+    code = _code_cache.get(key)
+    if code is None:
+        path = _code_path(key) if code_cache_dir else None
+        code = _load_code(path) if path else None
+        if code is None:
+            scratch = dict(namespace)
+            exec(make_code(), scratch)
+            code = scratch[name].__code__
+            if path:
+                _save_code(path, code)
+        _code_cache[key] = code
+    return FunctionType(code, namespace, name, defaults)
+
+def _spec(item):
+    # Descriptor classes stand in for their checks, editing set_code() makes a new entry
+    if isinstance(item, tuple):
+        return tuple(map(_spec, item))
+    if isinstance(item, type):
+        return (item.__module__, item.__qualname__, item._check_lines)
+    return item
+
+def _code_path(key):
+    # Like __pycache__: one file per spec and interpreter bytecode version
+    # Only needed with a disk cache, kept off the import path
+    import hashlib
+    import importlib.util
+    digest = hashlib.sha1(repr((_spec(key), _CODE_VERSION,
+                                importlib.util.MAGIC_NUMBER)).encode()).hexdigest()
+    return os.path.join(code_cache_dir, '%s.%s.marshal' % (digest, sys.implementation.cache_tag))
+
+def _load_code(path):
+    import marshal
+    try:
+        with open(path, 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+def _save_code(path, code):
+    # Write then rename, concurrent workers never see half a file
+    import marshal
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            marshal.dump(code, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def _build_init(qualname, descriptors, slots=False):
+    # exec the generated code, defaults and descriptors are resolved from its globals
+    namespace = {}
+    defaults = {}
+    for desc in descriptors:
+        namespace['_desc_%s' % desc.name] = desc
+        if desc.default is not _MISSING:
+            namespace['_dflt_%s' % desc.name] = defaults[desc.name] = desc.default
+    fields = [desc.name for desc in descriptors]
+    def make_code():
+        inline = {desc.name: type(desc)._check_lines + [_store_code(desc.name, slots)]
+                  for desc in descriptors}
+        return _make_init(fields, defaults, inline)
+    key = ('__init__', tuple(fields), tuple(map(type, descriptors)), tuple(defaults), slots)
+    init = _cached_function(key, make_code, '__init__', namespace,
+                            tuple(defaults.values()) or None)
+    init.__qualname__ = '%s.__init__' % qualname
+    return init
+
+def _make_trusted(fields, defaults=(), slots=False):
+    '''
+    Make a trusted() classmethod: same arguments as __init__, but the
+    values go straight into the instance dict (or slots), nothing checked
+    '''
+    code = 'def trusted(_cls, %s):\n' % _make_args(fields, defaults)
+    code += '    _inst = _new(_cls)\n'
+    if not slots:
+        code += '    _dict = _inst.__dict__\n'
+    for name in fields:
+        if slots:
+            code += '    _inst.%s = %s\n' % (_slot_name(name), name)
+        else:
+            code += '    _dict[%r] = %s\n' % (name, name)
+    code += '    return _inst\n'
+    return code
+
+def _build_trusted(cls):
+    descriptors = [getattr(cls, name) for name in cls._fields]
+    namespace = {'_new': object.__new__}
+    defaults = {}
+    for desc in descriptors:
+        if desc.default is not _MISSING:
+            namespace['_dflt_%s' % desc.name] = defaults[desc.name] = desc.default
+    slots = descriptors[0].slot is not None
+    key = ('trusted', tuple(cls._fields), slots, tuple(defaults))
+    trusted = _cached_function(key, partial(_make_trusted, cls._fields, defaults, slots),
+                               'trusted', namespace, tuple(defaults.values()) or None)
+    trusted.__qualname__ = '%s.trusted' % cls.__qualname__
+    return trusted
+
+@classmethod
+def _make_trusted_first(cls, *args, **kwargs):
+    # Stands in for trusted() until the first call replaces it with the generated one
+    owner = next(base for base in cls.__mro__ if 'trusted' in vars(base))
+    owner.trusted = classmethod(_build_trusted(owner))
+    return cls.trusted(*args, **kwargs)
+
+def _store_code(name, slots):
+    if slots:
+        return '_inst.%s = value' % _slot_name(name)
+    return '_inst.__dict__[%r] = value' % name
+
+def _read_code(obj, name, slots):
+    # slots None reads through the attribute, for the row views of columns/records
+    if slots is None:
+        return '%s.%s' % (obj, name)
+    if slots:
+        return '%s.%s' % (obj, _slot_name(name))
+    return '%s.__dict__[%r]' % (obj, name)
+
+def _make_compare(method, fields, slots):
+    '''
+    Make __eq__ or __hash__ for a frozen class, on the tuple of its field values
+    '''
+    def values(obj):
+        return '(%s,)' % ', '.join(_read_code(obj, name, slots) for name in fields)
+    if method == '__hash__':
+        return 'def __hash__(self):\n    return hash(%s)\n' % values('self')
+    if slots is None:
+        # Views compare equal to the instances of their structure _cls
+        check = 'not isinstance(other, _cls)'
+    else:
+        check = 'other.__class__ is not self.__class__'
+    return ('def __eq__(self, other):\n'
+            '    if %s:\n'
+            '        return NotImplemented\n'
+            '    return %s == %s\n' % (check, values('self'), values('other')))
+
+def _build_compare(qualname, method, fields, slots, cls=None):
+    func = _cached_function((method, tuple(fields), slots),
+                            partial(_make_compare, method, fields, slots), method, {'_cls': cls})
+    func.__qualname__ = '%s.%s' % (qualname, method)
+    return func
+
+def _view_methods(structure, qualname):
+    '''
+    Class attributes of a row view class of structure: the structure itself, and
+    for frozen ones __eq__ and __hash__ reading the fields through the view descriptors
+    '''
+    methods = {'_view_of': structure}
+    if structure._frozen:
+        for method in ('__eq__', '__hash__'):
+            methods[method] = _build_compare(qualname, method, structure._fields, None, structure)
+    return methods
+
+def _frozen_setattr(self, name, value):
+    if name in self._fields:
+        raise AttributeError("can't set frozen field %r" % name)
+    raise AttributeError("can't add attribute %r to frozen %s" % (name, type(self).__name__))
+
+def _frozen_delattr(self, name):
+    raise AttributeError("can't delete attribute %r of frozen %s" % (name, type(self).__name__))
+
+def _make_batch(fields, defaults=(), inline=(), convert=()):
+    '''
+    Give a list of fields names, make a _build_rows function building one
+    instance per row in a single loop, with the checks of inline pasted in
+    Bad rows end up in _errors as RowError and the loop carries on
+    Fields in convert go through _conv_<field> first (e.g. text from a CSV)
+    '''
+    code = 'def _build_rows(_rows, _start, _instances, _errors, _pick=None):\n'
+    code += '    for _lineno, _row in _enumerate(_rows, _start):\n'
+    code += '        self = None\n'
+    code += '        try:\n'
+    code += '            _values = _row if _pick is None else _pick(_row)\n'
+    if defaults:
+        first = len(fields) - len(defaults)
+        code += '            if %d <= _len(_values) < %d:\n' % (first, len(fields))
+        code += '                _values = (*_values, *_dflt_tail[_len(_values) - %d:])\n' % first
+    code += '            %s, = _values\n' % ', '.join(map(_local, fields))
+    code += '            _inst = _new(_cls)\n'
+    for name in fields:
+        code += '            self = _desc_%s\n' % name
+        if name in convert:
+            code += '            value = _conv_%s(%s)\n' % (name, _local(name))
+        else:
+            code += '            value = %s\n' % _local(name)
+        for line in inline[name]:
+            code += '            ' + line + '\n'
+    code += '        except (TypeError, ValueError, IndexError) as e:\n'
+    code += '            _errors.append(_RowError(_lineno, None if self is None else self.name, _row, e))\n'
+    code += '        else:\n'
+    code += '            _instances.append(_inst)\n'
+    return code
+
+def _build_batch(cls, converters=None, trusted=False):
+    # Same idea as _build_init, but for a whole batch of rows at once
+    # converters maps field names to a function applied to the raw value first
+    # trusted leaves the checks out, only storing the values
+    descriptors = [getattr(cls, name) for name in cls._fields]
+    namespace = {'_cls': cls, '_new': object.__new__, '_RowError': RowError}
+    conv = []
+    for desc in descriptors:
+        namespace['_desc_%s' % desc.name] = desc
+        if converters and desc.name in converters:
+            namespace['_conv_%s' % desc.name] = converters[desc.name]
+            conv.append(desc.name)
+    defaults = [desc.name for desc in descriptors if desc.default is not _MISSING]
+    namespace['_dflt_tail'] = tuple(getattr(cls, name).default for name in defaults)
+    def make_code():
+        inline = {desc.name: ([] if trusted else type(desc)._check_lines)
+                             + [_store_code(desc.name, desc.slot is not None)]
+                  for desc in descriptors}
+        return _make_batch(cls._fields, defaults, inline, conv)
+    key = ('_build_rows', tuple(cls._fields), tuple(map(type, descriptors)),
+           tuple(desc.slot is not None for desc in descriptors), tuple(defaults), tuple(conv),
+           trusted)
+    build = _cached_function(key, make_code, '_build_rows', namespace, (None,))
+    build.__qualname__ = '%s._build_rows' % cls.__qualname__
+    return build
+
+def _text_fields(cls):
+    # Converters for text coming from a CSV file
+    descriptors = [getattr(cls, name) for name in cls._fields]
+    return {desc.name: desc.ty for desc in descriptors
+            if getattr(desc, 'ty', object) not in (object, str)}
+
+class RowError(namedtuple('RowError', ['lineno', 'field', 'row', 'error'])):
+    def __str__(self):
+        if self.field is None:
+            return 'row %d: %s' % (self.lineno, self.error)
+        return 'row %d: %s: %s' % (self.lineno, self.field, self.error)
+
+class BatchError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('%d bad rows\n%s' % (len(errors), '\n'.join(map(str, errors))))
+
+def _make_method(header, lines):
+    code = 'def %s:\n' % header
+    for line in lines or ['pass']:
+        code += '    ' + line + '\n'
+    return code
+
+def _collect_code(dcls, attr):
+    # Lines returned by each set_code()/column_code() along the MRO, most derived first
+    return [line for base in dcls.__mro__
+            if attr in vars(base)
+            for line in vars(base)[attr].__func__()]
+
+class DescriptorMeta(type):
+    def __init__(self, clsname, bases, clsdict):
+        if '__set__' in clsdict:
+            raise TypeError('%s: define set_code(), not __set__' % clsname)
+        self._check_lines = _collect_code(self, 'set_code')
+        if self._frozen:
+            self._set_lines = ['raise AttributeError("can\'t set frozen field %r" % self.name)']
+        else:
+            self._set_lines = self._check_lines + [self._store_line]
+        self._column_lines = _collect_code(self, 'column_code')
+        qualname = clsdict.get('__qualname__', clsname)
+        for name, args, lines in [('__set__', 'self, instance, value', self._set_lines),
+                                  ('check', 'self, value', self._check_lines),
+                                  ('check_column', 'self, column', self._column_lines)]:
+            header = '%s(%s)' % (name, args)
+            func = _cached_function((header, tuple(lines)),
+                                    partial(_make_method, header, lines), name, {})
+            func.__qualname__ = '%s.%s' % (qualname, name)
+            setattr(self, name, func)
+        super().__init__(clsname, bases, clsdict)
+
+    def variant(self, slots=False, frozen=False):
+        # Same checks, but storing into the slot member given by Structmeta
+        # and/or refusing assignment, made once per descriptor class
+        if '_variants' not in vars(self):
+            self._variants = {}
+        key = (slots, frozen)
+        if key not in self._variants:
+            mixins = (_Frozen,) * frozen + (_SlotStorage,) * slots
+            self._variants[key] = type(self)(self.__name__, mixins + (self,),
+                                             {'__qualname__': self.__qualname__})
+        return self._variants[key]
+
+class Descriptor(metaclass=DescriptorMeta):
+    _store_line = 'instance.__dict__[self.name] = value'
+    _frozen = False
+    dtype = 'O' # NumPy dtype of the column in a StructureArray
+    pack_format = None # struct format code of the field in to_bytes(), None if it can't be packed
+    slot = None # Member descriptor of the backing slot, slots=True only
+    
+    def __init__(self, name=None, *, default=_MISSING):
+        self.name = name
+        self.default = default
+    # No printing down here, this is the hot path
+    def __get__(self, instance, cls):
+        if instance is None:
+            return self
+        return instance.__dict__[self.name]
+
+    def __delete__(self, instance):
+        del instance.__dict__[self.name]
+
+    def set_many(self, instances, values):
+        '''
+        Set this field to values[i] on instances[i], all the values are checked
+        first (as one column if values is a NumPy array) and nothing is written
+        if any of them fails. Row views of a StructureArray write into it, those
+        of a RecordFile are read only.
+        '''
+        if self._frozen:
+            raise AttributeError("can't set frozen field %r" % self.name)
+        if len(instances) != len(values):
+            raise ValueError('%d instances but %d values' % (len(instances), len(values)))
+        if hasattr(values, 'dtype'):
+            self.check_column(values)
+            values = values.tolist() # Plain Python scalars, like a normal assignment
+        else:
+            check = self.check
+            for value in values:
+                check(value)
+        views = {type(instance) for instance in instances if type(instance)._view_of is not None}
+        if views:
+            # Row views keep the field in their array or file, write through their own
+            # descriptor (checked again, but a view is one row of a column anyway)
+            for view in views:
+                if not getattr(view, self.name).writable:
+                    raise AttributeError('%s rows are read only' % view.__name__)
+            name = self.name
+            for instance, value in zip(instances, values):
+                setattr(instance, name, value)
+        elif self.slot is None:
+            name = self.name
+            for instance, value in zip(instances, values):
+                instance.__dict__[name] = value
+        else:
+            store = self.slot.__set__
+            for instance, value in zip(instances, values):
+                store(instance, value)
+
+class _Frozen:
+    # Mixed in front of a descriptor class for Structure(frozen=True) classes
+    _frozen = True
+
+    def __delete__(self, instance):
+        raise AttributeError("can't delete frozen field %r" % self.name)
+
+class _SlotStorage:
+    # Mixed in front of a descriptor class for Structure(slots=True) classes
+    # Reads and writes make one more call than the __dict__ ones (the attrgetter
+    # and the member descriptor), slots trade some speed for memory
+    _store_line = 'self.slot.__set__(instance, value)'
+
+    def __get__(self, instance, cls):
+        if instance is None:
+            return self
+        return self._read_slot(instance)
+
+    def __delete__(self, instance):
+        self.slot.__delete__(instance)
+
+_signature_cache = {}
+
+def make_signature(descriptors):
+    # Signatures are immutable, classes with the same fields and defaults share one
+    from inspect import Parameter, Signature
+    key = tuple((desc.name, type(desc.default), desc.default) for desc in descriptors)
+    try:
+        return _signature_cache[key]
+    except KeyError:
+        pass
+    except TypeError: # Unhashable default, build it every time
+        key = None
+    sig = Signature(
+            Parameter(desc.name,
+                Parameter.POSITIONAL_OR_KEYWORD,
+                default=Parameter.empty if desc.default is _MISSING else desc.default)
+            for desc in descriptors
+            )
+    if key is not None:
+        _signature_cache[key] = sig
+    return sig
+
+class Structure(metaclass=Structmeta):
+    __slots__ = () # So that slots=True subclasses really lose their __dict__
+    _fields = []
+    _interned = None # Intern table of intern=True classes
+    _frozen = False
+    _view_of = None # Structure class of the row views of StructureArray/RecordFile
+    # Only used by classes without fields or with a hand written __init__
+    def __init__(self, *args, **kwargs):
+        bound = type(self).__signature__.bind(*args, **kwargs)
+        for name, val in bound.arguments.items():
+            setattr(self, name, val)
+
+    @classmethod
+    def intern(cls, instance):
+        '''
+        Give the first instance seen that is equal to instance (intern=True classes),
+        keep that one and drop the copy
+        '''
+        if cls._interned is None:
+            raise TypeError('%s is not an intern=True class' % cls.__name__)
+        return cls._interned.setdefault(instance, instance)
+
+    # trusted(*args, **kwargs) is generated per class by Structmeta: __init__ minus the checks,
+    # for data known to be good (our own snapshots), check it later with validate_all()
+
+    def validate(self):
+        '''
+        Run the descriptor checks on the current field values, e.g. of a trusted() instance
+        '''
+        cls = type(self)
+        for name in self._fields:
+            getattr(cls, name).check(getattr(self, name))
+
+    @classmethod
+    def validate_all(cls, instances, errors=None):
+        '''
+        validate() every instance. Bad ones are appended to errors as RowError
+        (with the instance as row) if a list is given, otherwise a BatchError is
+        raised at the end. Only reads, so it can run in another thread.
+        '''
+        checks = [(name, getattr(cls, name).check) for name in cls._fields]
+        bad = [] if errors is None else errors
+        for lineno, instance in enumerate(instances, 1):
+            for name, check in checks:
+                try:
+                    check(getattr(instance, name))
+                except (TypeError, ValueError) as e:
+                    bad.append(RowError(lineno, name, instance, e))
+                    break
+        if errors is None and bad:
+            raise BatchError(bad)
+
+    @classmethod
+    def from_rows(cls, rows, errors=None, trusted=False):
+        '''
+        Build one instance per row (values in field order), validating all of them
+        in one pass. Bad rows are appended to errors as RowError if a list is given,
+        otherwise a BatchError listing every one of them is raised at the end.
+        trusted=True skips the checks, as trusted() does.
+        '''
+        return cls._from_rows(rows, 1, errors, trusted=trusted)
+
+    @classmethod
+    def from_csv(cls, path, errors=None):
+        '''
+        Same as from_rows() for a CSV file with a header row naming the fields,
+        text gets converted with the type of each field first.
+        '''
+        import csv # Pulls in re, only pay for it when reading CSV
+        with open(path, newline='') as f:
+            rows = csv.reader(f)
+            header = next(rows, [])
+            try:
+                columns = [header.index(name) for name in cls._fields]
+            except ValueError:
+                raise TypeError('%s: header must name %s' % (path, ', '.join(cls._fields))) from None
+            pick = lambda row: [row[n] for n in columns]
+            return cls._from_rows(rows, 2, errors, convert=_text_fields, pick=pick)
+
+    def to_bytes(self):
+        '''
+        Pack the fields into a fixed size record, see structures.packing
+        '''
+        return type(self)._packer().pack(self)
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        Build one instance from a record made by to_bytes(), validating it
+        '''
+        return cls._packer().unpack(data)
+
+    @classmethod
+    def pack_many(cls, instances):
+        '''
+        Pack instances one record after the other into a single bytearray
+        '''
+        return cls._packer().pack_many(instances)
+
+    @classmethod
+    def unpack_many(cls, buffer, errors=None, trusted=False):
+        '''
+        Build one instance per record of buffer (anything with the buffer protocol,
+        read through a memoryview without copying it), errors and trusted as in from_rows()
+        '''
+        return cls._packer().unpack_many(buffer, errors, trusted)
+
+    @classmethod
+    def _packer(cls):
+        if '_packing' not in vars(cls):
+            from .packing import Packer # Pulls in struct, only pay for it when packing
+            cls._packing = Packer(cls)
+        return vars(cls)['_packing']
+
+    @classmethod
+    def _from_rows(cls, rows, start, errors, convert=None, pick=None, trusted=False):
+        # convert(cls) gives the converters of the fields, one batch loop is made for each
+        key = '_batch' if convert is None else '_batch' + convert.__name__
+        if trusted:
+            key += '_trusted'
+        if key not in vars(cls):
+            setattr(cls, key, _build_batch(cls, convert and convert(cls), trusted))
+        instances = []
+        bad = [] if errors is None else errors
+        vars(cls)[key](rows, start, instances, bad, pick)
+        if errors is None and bad:
+            raise BatchError(bad)
+        if cls._interned is not None:
+            intern = cls._interned.setdefault
+            instances = [intern(instance, instance) for instance in instances]
+        return instances
+
+class Typed(Descriptor):
+    ty = object # Expected type
+    kinds = 'biufcmMSUV' # Accepted dtype kinds of a whole column
+    @staticmethod
+    def set_code():
+        return ['if not _isinstance(value, self.ty):',
+                '    raise TypeError("Expected %s" % self.ty)']
+
+    @staticmethod
+    def column_code():
+        return ['if column.dtype.kind == "O":',
+                '    if not _all(_isinstance(value, self.ty) for value in column):',
+                '        raise TypeError("Expected %s" % self.ty)',
+                'elif column.dtype.kind not in self.kinds:',
+                '    raise TypeError("Expected %s" % self.ty)']
+
+class Integer(Typed):
+    ty = int
+    kinds = 'iu'
+    dtype = 'i8'
+    pack_format = 'q'
+class Float(Typed):
+    ty = float
+    kinds = 'f'
+    dtype = 'f8'
+    pack_format = 'd'
+class String(Typed):
+    ty = str
+    kinds = 'U'
+    pack_format = 's' # Needs a width, the maxlen of a Sized field
+
+class Positive(Descriptor):
+    @staticmethod
+    def set_code():
+        return ['if value < 0:',
+                '    raise ValueError("Must be >= 0")']
+
+    @staticmethod
+    def column_code():
+        return ['if (column < 0).any():',
+                '    raise ValueError("Must be >= 0")']
+
+class PositiveInteger(Integer, Positive):
+    pass
+class PositiveFloat(Float, Positive):
+    pass
+
+class Sized(Descriptor):
+    def __init__(self, *args, maxlen, **kwargs):
+        self.maxlen = maxlen
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def set_code():
+        return ['if _len(value) > self.maxlen:',
+                '    raise ValueError("Too long, max %d" % self.maxlen)']
+
+    @staticmethod
+    def column_code():
+        # A 'U' column no wider than maxlen can't hold anything too long
+        return ['if column.dtype.kind != "U" or column.dtype.itemsize // 4 > self.maxlen:',
+                '    if _any(_len(value) > self.maxlen for value in column):',
+                '        raise ValueError("Too long, max %d" % self.maxlen)']
+
+class Regex(Descriptor):
+    def __init__(self, *args, pat, **kwargs):
+        import re # Pulls in a lot, only pay for it with a Regex field
+        self.pat = re.compile(pat)
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def set_code():
+        return ['if not self.pat.match(value):',
+                '    raise ValueError("Invalid string, must match %r" % self.pat.pattern)']
+
+    @staticmethod
+    def column_code():
+        return ['if not _all(self.pat.match(value) for value in column):',
+                '    raise ValueError("Invalid string, must match %r" % self.pat.pattern)']
+
+class Range(Descriptor):
+    def __init__(self, *args, low, high, **kwargs):
+        self.low = low
+        self.high = high
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def set_code():
+        return ['if not self.low <= value <= self.high:',
+                '    raise ValueError("Must be between %r and %r" % (self.low, self.high))']
+
+    @staticmethod
+    def column_code():
+        return ['if (column < self.low).any() or (column > self.high).any():',
+                '    raise ValueError("Must be between %r and %r" % (self.low, self.high))']
+
+class OneOf(Descriptor):
+    def __init__(self, *args, choices, **kwargs):
+        self.choices = frozenset(choices)
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def set_code():
+        return ['if value not in self.choices:',
+                '    raise ValueError("Must be one of %s" % _sorted(self.choices))']
+
+    @staticmethod
+    def column_code():
+        return ['if not self.choices.issuperset(column.tolist()):',
+                '    raise ValueError("Must be one of %s" % _sorted(self.choices))']
+
+class SizedString(String, Sized):
+    pass
+class SizedRegexString(String, Sized, Regex):
+    pass
+class RangeInteger(Integer, Range):
+    pass
+class RangeFloat(Float, Range):
+    pass
@@ -0,0 +1,198 @@
+"""
+debug, debugmethods, debugmeta and debugattr, switched on with META_DEBUG or
+set_debug() and free when off, with sampling and a ring buffer sink.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps, partial
+from itertools import count
+
+debug_enabled = os.environ.get('META_DEBUG', '0') not in ('', '0')
+debug_sink = logging.getLogger(__name__).debug
+
+def set_debug(enabled=True, sink=None):
+    '''
+    Switch the debug decorators on or off and optionally change where they log,
+    only functions and classes decorated afterwards are affected
+    '''
+    global debug_enabled, debug_sink
+    debug_enabled = enabled
+    if sink is not None:
+        debug_sink = sink
+
+def debug(func=None, *, prefix='', every=1, rate=None):
+    if func is None:
+        # Wasn't passed
+        return partial(debug, prefix=prefix, every=every, rate=rate)
+    if not debug_enabled:
+        return func
+    msg = prefix + func.__qualname__
+    # func is function to be wrapped
+    if every == 1 and rate is None:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            debug_sink(msg)
+            return func(*args, **kwargs)
+        return wrapper
+
+    sample = _make_sampler(every, rate)
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if sample():
+            debug_sink(msg)
+        return func(*args, **kwargs)
+    return wrapper
+
+def _make_sampler(every=1, rate=None):
+    '''
+    Make a function telling whether to trace this event: 1 in every events,
+    and no more than rate of them per second
+    '''
+    calls = count()
+    window = [0, 0] # Current second, events traced during it
+    def sample():
+        # No locks, under threads the counts are approximate and that's fine
+        if next(calls) % every:
+            return False
+        if rate is not None:
+            now = int(time.monotonic())
+            if window[0] != now:
+                window[:] = [now, 0]
+            if window[1] >= rate:
+                return False
+            window[1] += 1
+        return True
+    return sample
+
+def debugmethods(cls=None, *, prefix='', every=1, rate=None):
+    #cls is a class
+    if cls is None:
+        return partial(debugmethods, prefix=prefix, every=every, rate=rate)
+    if not debug_enabled:
+        return cls
+    for key, val in vars(cls).items():
+        if callable(val):
+            setattr(cls, key, debug(val, prefix=prefix, every=every, rate=rate))
+    return cls
+
+class debugmeta(type):
+    # class Base(metaclass=debugmeta, every=100), subclasses inherit the options
+    def __new__(cls, name, bases, clsdict, **options):
+        clsobj = super().__new__(cls, name,
+                                 bases, clsdict)
+        options = {**getattr(clsobj, '_debug_options', {}), **options}
+        clsobj._debug_options = options
+        clsobj = debugmethods(clsobj, **options)
+        return clsobj
+
+class _AuditField:
+    # Data descriptor reporting reads of one field, put in front of whatever was there before:
+    # a descriptor gets the calls passed on, anything else is the class level default
+    def __init__(self, name, inner, sample):
+        self.name = name
+        self.inner = inner
+        self.sample = sample
+        self.msg = 'Get: ' + name
+        self.gets = hasattr(type(inner), '__get__')
+        self.sets = hasattr(type(inner), '__set__')
+        self.deletes = hasattr(type(inner), '__delete__')
+
+    def __get__(self, instance, cls):
+        if instance is None:
+            return self if self.inner is None else self.inner
+        if self.sample():
+            debug_sink(self.msg)
+        if self.sets or self.gets and self.name not in instance.__dict__:
+            return self.inner.__get__(instance, cls)
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            if self.inner is not None:
+                return self.inner
+            raise AttributeError(self.name) from None
+
+    def __set__(self, instance, value):
+        if self.sets:
+            self.inner.__set__(instance, value)
+        else:
+            instance.__dict__[self.name] = value
+
+    def __delete__(self, instance):
+        if self.deletes:
+            self.inner.__delete__(instance)
+        else:
+            del instance.__dict__[self.name]
+
+def debugattr(cls=None, *, fields=None, every=1, rate=None):
+    '''
+    Report reads of the data fields of cls (its _fields unless given), through
+    one descriptor per field, other attributes and methods are left alone
+    '''
+    if cls is None:
+        return partial(debugattr, fields=fields, every=every, rate=rate)
+    if not debug_enabled:
+        return cls
+    saved = {}
+    for name in (getattr(cls, '_fields', ()) if fields is None else fields):
+        inner = vars(cls).get(name)
+        saved[name] = inner
+        setattr(cls, name, _AuditField(name, inner, _make_sampler(every, rate)))
+    cls._debugattr_saved = saved
+    return cls
+
+def undebugattr(cls):
+    # Take the debugattr() descriptors off again, cls is back the way it was
+    saved = vars(cls).get('_debugattr_saved')
+    if saved is None:
+        return cls
+    for name, inner in saved.items():
+        if inner is None:
+            delattr(cls, name)
+        else:
+            setattr(cls, name, inner)
+    del cls._debugattr_saved
+    return cls
+
+class TraceBuffer:
+    '''
+    A debug sink keeping events in a bounded ring in memory, written out to a file
+    by a background thread. deque.append() and popleft() are atomic, so traced
+    calls never wait on a lock or on the disk; if the writer falls behind the
+    oldest events get dropped. Whatever is left gets written at close(), or at
+    exit if it was never called.
+    '''
+    def __init__(self, path, size=65536, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.events = deque(maxlen=size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='TraceBuffer', daemon=True)
+        self._thread.start()
+        # The thread is a daemon, without this the events of the last interval die with it
+        atexit.register(self.close)
+
+    def __call__(self, msg):
+        self.events.append((time.time(), threading.get_ident(), msg))
+
+    def drain(self):
+        with open(self.path, 'a') as f:
+            while True:
+                try:
+                    when, thread, msg = self.events.popleft()
+                except IndexError:
+                    break
+                f.write('%.6f %d %s\n' % (when, thread, msg))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.drain()
+        self.drain()
+
+    def close(self):
+        atexit.unregister(self.close)
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,149 @@
+"""
+Fixed size binary records for Structure classes, packed with a struct.Struct
+format made from the fields: Integer is 'q', Float is 'd' and String needs a
+maxlen (SizedString) which is its width in bytes of UTF-8, padded with NULs.
+Little endian, no alignment, so the records are the same on every machine.
+"""
+import struct
+from functools import partial
+
+from .core import _cached_function, _read_code
+
+def _decode(data):
+    return data.rstrip(b'\0').decode()
+
+def _packed_fields(cls):
+    # Converters for records coming out of struct.unpack()
+    return {name: _decode for name in cls._fields
+            if getattr(cls, name).pack_format == 's'}
+
+def _encoder(name, width):
+    # struct cuts strings that don't fit without a word, don't let it
+    def encode(value):
+        data = value.encode()
+        if len(data) > width:
+            raise ValueError('%s: %d bytes of UTF-8, max %d' % (name, len(data), width))
+        return data
+    return encode
+
+def field_format(desc):
+    '''
+    Give the struct format of a descriptor, TypeError if it can't be packed
+    '''
+    code = desc.pack_format
+    if code is None:
+        raise TypeError('field %r: %s can\'t be packed' % (desc.name, type(desc).__name__))
+    if code == 's':
+        width = getattr(desc, 'maxlen', None)
+        if width is None:
+            raise TypeError('field %r: strings need a maxlen to be packed' % desc.name)
+        code = '%ds' % width
+    return code
+
+def _make_pack(fields, encode, slots):
+    '''
+    Make pack() and pack_many() for a list of field names, read straight from the
+    instance storage. Fields in encode go through _enc_<field> first
+    '''
+    args = ', '.join('_enc_%s(%s)' % (name, _read_code('self', name, slots))
+                     if name in encode else _read_code('self', name, slots)
+                     for name in fields)
+    code = 'def pack(self):\n'
+    code += '    try:\n'
+    code += '        return _pack(%s)\n' % args
+    code += '    except _struct_error as e:\n'
+    code += '        raise _pack_error(e, self) from None\n'
+    code += 'def pack_many(instances):\n'
+    code += '    _buf = bytearray(_size * len(instances))\n'
+    code += '    _offset = 0\n'
+    code += '    try:\n'
+    code += '        for self in instances:\n'
+    code += '            _pack_into(_buf, _offset, %s)\n' % args
+    code += '            _offset += _size\n'
+    code += '    except _struct_error as e:\n'
+    code += '        raise _pack_error(e, self, _offset // _size) from None\n'
+    code += '    return _buf\n'
+    return code
+
+def _make_unpack(fields, decode, intern):
+    '''
+    Make unpack() for a list of field names: one record straight into the class,
+    checked by its __init__. Fields in decode go through _decode() first
+    '''
+    args = ', '.join('_decode(_v%d)' % n if name in decode else '_v%d' % n
+                     for n, name in enumerate(fields))
+    code = 'def unpack(_data):\n'
+    code += '    if len(_data) != _size:\n'
+    code += '        raise _size_error(_data)\n'
+    code += '    %s, = _unpack(_data)\n' % ', '.join('_v%d' % n for n in range(len(fields)))
+    if intern:
+        code += '    _inst = _cls(%s)\n' % args
+        code += '    return _intern(_inst, _inst)\n'
+    else:
+        code += '    return _cls(%s)\n' % args
+    return code
+
+class Packer:
+    '''
+    The struct.Struct of a Structure class and the functions packing its instances,
+    made once per class by Structure._packer(). Row view classes get the formats
+    of their structure, but read the fields through their own descriptors.
+    '''
+    def __init__(self, cls):
+        view = cls._view_of is not None
+        if view:
+            cls = cls._view_of
+        if not cls._fields:
+            raise TypeError('%s has no fields to pack' % cls.__name__)
+        descriptors = [getattr(cls, name) for name in cls._fields]
+        self.cls = cls
+        self.formats = [field_format(desc) for desc in descriptors]
+        self.struct = struct.Struct('<' + ''.join(self.formats))
+        self.size = self.struct.size
+        fields = tuple(cls._fields)
+        encode = tuple(desc.name for desc in descriptors if desc.pack_format == 's')
+        slots = None if view else descriptors[0].slot is not None
+        namespace = {'_pack': self.struct.pack, '_pack_into': self.struct.pack_into,
+                     '_unpack': self.struct.unpack, '_size': self.size, '_cls': cls,
+                     '_decode': _decode, '_struct_error': struct.error,
+                     '_pack_error': self._pack_error, '_size_error': self._size_error}
+        if cls._interned is not None:
+            namespace['_intern'] = cls._interned.setdefault
+        for name in encode:
+            namespace['_enc_%s' % name] = _encoder(name, getattr(cls, name).maxlen)
+        make_code = lambda: _make_pack(fields, encode, slots)
+        for name in ('pack', 'pack_many'):
+            func = _cached_function((name, fields, encode, slots), make_code, name, namespace)
+            func.__qualname__ = '%s.%s' % (cls.__qualname__, name)
+            setattr(self, name, func)
+        # A single record skips the batch loop of unpack_many(), it's a plain __init__ call
+        intern = cls._interned is not None
+        self.unpack = _cached_function(('unpack', fields, encode, intern),
+                                       partial(_make_unpack, fields, encode, intern),
+                                       'unpack', namespace)
+        self.unpack.__qualname__ = '%s.unpack' % cls.__qualname__
+
+    def _pack_error(self, error, instance, index=None):
+        # struct refuses e.g. an Integer too big for 8 bytes, make it a ValueError like
+        # any bad value, naming the field (strings were checked by their encoder)
+        where = self.cls.__name__ if index is None else '%s record %d' % (self.cls.__name__, index)
+        for name, fmt in zip(self.cls._fields, self.formats):
+            if not fmt.endswith('s'):
+                try:
+                    struct.pack('<' + fmt, getattr(instance, name))
+                except struct.error:
+                    where += ' field %r' % name
+                    break
+        return ValueError('%s: %s' % (where, error))
+
+    def _size_error(self, data):
+        return ValueError('%s records are %d bytes, got %d'
+                          % (self.cls.__name__, self.size, len(data)))
+
+    def unpack_many(self, buffer, errors=None, trusted=False):
+        view = memoryview(buffer).cast('B')
+        if len(view) % self.size:
+            raise ValueError('%d bytes is not a whole number of %d byte %s records'
+                             % (len(view), self.size, self.cls.__name__))
+        return self.cls._from_rows(self.struct.iter_unpack(view), 1, errors,
+                                   convert=_packed_fields, trusted=trusted)
@@ -0,0 +1,103 @@
+"""
+timed, timedmethods and profilemeta: per-qualname call counts and latency
+histograms, queried with timings() or dumped periodically.
+"""
+import threading
+import time
+from functools import wraps
+
+from . import debugging
+
+class LatencyStats:
+    '''
+    Call count and log2 histogram of the latencies (in ns) of one function
+    '''
+    def __init__(self):
+        self.buckets = [0] * 64 # buckets[n] counts latencies with n bits
+        self.total = 0
+        self.max = 0
+
+    def add(self, elapsed):
+        self.buckets[elapsed.bit_length()] += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    @property
+    def count(self):
+        return sum(self.buckets)
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile
+        rank = self.count * p / 100
+        seen = 0
+        for bits, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min((1 << bits) - 1, self.max)
+        return 0
+
+    def summary(self):
+        count = self.count
+        return {'count': count,
+                'mean': self.total / count if count else 0.0,
+                'p50': self.percentile(50),
+                'p99': self.percentile(99),
+                'max': self.max}
+
+_timings = {}
+
+def timed(func):
+    stats = _timings.setdefault(func.__qualname__, LatencyStats())
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.add(time.perf_counter_ns() - start)
+    return wrapper
+
+def timedmethods(cls):
+    for key, val in vars(cls).items():
+        if callable(val):
+            setattr(cls, key, timed(val))
+    return cls
+
+class profilemeta(type):
+    def __new__(cls, name, bases, clsdict):
+        clsobj = super().__new__(cls, name,
+                                 bases, clsdict)
+        clsobj = timedmethods(clsobj)
+        return clsobj
+
+def timings(prefix=''):
+    '''
+    Summary of every timed function whose qualname starts with prefix
+    '''
+    return {name: stats.summary() for name, stats in _timings.items()
+            if name.startswith(prefix)}
+
+def reset_timings():
+    for stats in _timings.values():
+        stats.__init__()
+
+def dump_timings(sink=None, prefix=''):
+    # One line per function, slowest p99 first
+    sink = sink or debugging.debug_sink
+    rows = sorted(timings(prefix).items(), key=lambda item: item[1]['p99'], reverse=True)
+    for name, s in rows:
+        sink('%-40s %8d calls  p50 %9dns  p99 %9dns  max %9dns'
+             % (name, s['count'], s['p50'], s['p99'], s['max']))
+
+def dump_timings_every(interval, sink=None, prefix=''):
+    '''
+    Run dump_timings() every interval seconds from a daemon thread,
+    returns the Event that stops it
+    '''
+    stop = threading.Event()
+    def run():
+        while not stop.wait(interval):
+            dump_timings(sink, prefix)
+    threading.Thread(target=run, name='dump_timings', daemon=True).start()
+    return stop
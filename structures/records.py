@@ -0,0 +1,199 @@
+"""
+Record files: a header naming the fields and their struct formats, then the
+to_bytes() records of a Structure class one after the other. RecordFile maps
+the file instead of reading it, so any number of processes can open a huge
+one and share the pages the OS already caches. Records reads the same layout
+out of any buffer, e.g. shared memory (see structures.shared).
+"""
+import json
+import mmap
+import struct
+
+from .core import _view_methods
+from .packing import _decode
+
+try:
+    import numpy as np
+except ImportError: # Only needed for columns
+    np = None
+
+_MAGIC = b'STRUCTR1'
+_HEADER = struct.Struct('<8sI') # Magic and length of the JSON schema after it
+_ALIGN = 64 # Records start on a multiple of this
+_CHUNK = 65536 # Records packed at a time when writing
+
+def _schema(structure):
+    packer = structure._packer()
+    return {'name': structure.__qualname__,
+            'fields': [[name, fmt] for name, fmt in zip(structure._fields, packer.formats)]}
+
+def _header(structure, count):
+    # Header padded up to where the records start
+    schema = json.dumps(dict(_schema(structure), count=count)).encode()
+    header = _HEADER.pack(_MAGIC, len(schema)) + schema
+    return header + bytes(-len(header) % _ALIGN)
+
+def _chunks(structure, instances):
+    # Packed records, _CHUNK at a time so no copy of the whole batch is needed
+    pack_many = structure._packer().pack_many
+    for n in range(0, len(instances), _CHUNK):
+        yield pack_many(instances[n:n + _CHUNK])
+
+def write_records(path, structure, instances):
+    '''
+    Write instances of structure to path as a record file, replacing it
+    '''
+    instances = list(instances)
+    with open(path, 'wb') as f:
+        f.write(_header(structure, len(instances)))
+        for chunk in _chunks(structure, instances):
+            f.write(chunk)
+
+def _dtype_code(fmt):
+    if fmt.endswith('s'):
+        return 'S' + fmt[:-1]
+    return {'q': '<i8', 'd': '<f8'}[fmt]
+
+class _RecordField:
+    # Stands in for a field descriptor on record views, unpacks and checks on every read
+    writable = False # See Descriptor.set_many()
+    def __init__(self, desc, offset, fmt):
+        self.desc = desc
+        self.name = desc.name
+        self.offset = offset
+        self.unpack_from = struct.Struct('<' + fmt).unpack_from
+        self.decode = fmt.endswith('s')
+
+    def __get__(self, view, cls):
+        if view is None:
+            return self
+        value, = self.unpack_from(view._buffer, view._offset + self.offset)
+        if self.decode:
+            value = _decode(value)
+        self.desc.check(value)
+        return value
+
+    def __set__(self, view, value):
+        raise AttributeError('record files are read only')
+
+class Records:
+    '''
+    The records of Structure class structure in buffer, laid out as in a record
+    file. Rows are views reading (and checking) their fields from the buffer
+    when asked, columns are NumPy arrays over it, nothing is copied.
+    '''
+    _views = {}
+
+    def __init__(self, buffer, structure, name='buffer'):
+        self.structure = structure
+        packer = structure._packer()
+        buffer = memoryview(buffer)
+        try:
+            magic, length = _HEADER.unpack_from(buffer)
+            if magic != _MAGIC:
+                raise ValueError('%s: not structure records' % name)
+            schema = json.loads(bytes(buffer[_HEADER.size:_HEADER.size + length]))
+            if schema['fields'] != _schema(structure)['fields']:
+                raise TypeError('%s: records are %s, not %s' %
+                                (name, schema['fields'], _schema(structure)['fields']))
+            self._start = -(-(_HEADER.size + length) // _ALIGN) * _ALIGN
+            self.size = packer.size
+            self._count = schema['count']
+            if self._start + self._count * self.size > len(buffer):
+                raise ValueError('%s: truncated, %d records expected' % (name, self._count))
+        except (struct.error, ValueError, TypeError):
+            buffer.release() # Or whoever owns buffer can't close it
+            raise
+        self._buffer = buffer
+        self._view = self._view_class(structure, packer.formats)
+
+    @classmethod
+    def _view_class(cls, structure, formats):
+        # Row views are structure instances whose fields live in the file
+        if structure not in cls._views:
+            fields = {}
+            offset = 0
+            for name, fmt in zip(structure._fields, formats):
+                fields[name] = _RecordField(getattr(structure, name), offset, fmt)
+                offset += struct.calcsize('<' + fmt)
+            qualname = structure.__qualname__ + 'Record'
+            cls._views[structure] = type(structure)(
+                structure.__name__ + 'Record', (structure,),
+                {'__slots__': ('_buffer', '_offset'), '__qualname__': qualname,
+                 **_view_methods(structure, qualname), **fields})
+        return cls._views[structure]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            return self.column(index)
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('record index out of range')
+        view = object.__new__(self._view)
+        object.__setattr__(view, '_buffer', self._buffer) # Frozen structures refuse plain setattr
+        object.__setattr__(view, '_offset', self._start + index * self.size)
+        return view
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def array(self):
+        '''
+        All the records as a NumPy structured array over the mapping, strings as bytes
+        '''
+        if np is None:
+            raise ImportError('RecordFile columns need numpy')
+        dtype = np.dtype([(name, _dtype_code(fmt)) for name, fmt in
+                          zip(self.structure._fields, self.structure._packer().formats)])
+        return np.frombuffer(self._buffer, dtype=dtype, count=self._count, offset=self._start)
+
+    def column(self, name):
+        '''
+        One field of every record, a NumPy view over the mapping, not checked
+        '''
+        if name not in self.structure._fields:
+            raise KeyError(name)
+        return self.array()[name]
+
+    def load(self, start=0, stop=None):
+        '''
+        Build (and check) real instances out of records start to stop, see unpack_many()
+        '''
+        start, stop, _ = slice(start, stop).indices(self._count)
+        offset = self._start + start * self.size
+        return self.structure.unpack_many(
+                self._buffer[offset:offset + max(stop - start, 0) * self.size])
+
+    def close(self):
+        # BufferError while NumPy columns over the buffer are still around,
+        # row views left over fail with ValueError on their next read
+        self._buffer.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class RecordFile(Records):
+    '''
+    Records of a record file written by write_records(), mapped read only
+    '''
+    def __init__(self, path, structure):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            super().__init__(self._map, structure, path)
+        except (struct.error, ValueError, TypeError):
+            self._map.close()
+            raise
+
+    def close(self):
+        super().close()
+        self._map.close()
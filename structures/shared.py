@@ -0,0 +1,68 @@
+"""
+SharedRecords, Structure records in multiprocessing.shared_memory. The parent
+packs a batch once and workers attach to it by name: a SharedRecords pickles
+as that name and its structure class, so handing one to a Pool task sends a
+few bytes instead of every record.
+"""
+import hashlib
+import json
+import secrets
+import struct
+from multiprocessing import shared_memory
+
+from .records import Records, _chunks, _header, _schema
+
+def _block_name(structure):
+    # Named after the schema, so leftover blocks say what they hold
+    fields = json.dumps(_schema(structure)['fields']).encode()
+    return 'structs_%s_%s' % (hashlib.sha1(fields).hexdigest()[:12], secrets.token_hex(4))
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False) # The creator unlinks it
+    except TypeError: # Before 3.13, tracked by the resource tracker Pool workers share
+        return shared_memory.SharedMemory(name)
+
+class SharedRecords(Records):
+    '''
+    Records of Structure class structure in the shared memory block name.
+    SharedRecords.create() makes the block, the process that made it calls
+    unlink() once every worker is done with it.
+    '''
+    def __init__(self, name, structure, _memory=None):
+        memory = _attach(name) if _memory is None else _memory
+        try:
+            super().__init__(memory.buf, structure, name)
+        except (struct.error, ValueError, TypeError):
+            memory.close()
+            raise
+        self.name = name
+        self._memory = memory
+
+    @classmethod
+    def create(cls, structure, instances, name=None):
+        '''
+        Pack instances into a new shared memory block, named after the schema
+        of structure unless name is given
+        '''
+        instances = list(instances)
+        header = _header(structure, len(instances))
+        memory = shared_memory.SharedMemory(name or _block_name(structure), create=True,
+                                            size=len(header) + len(instances) * structure._packer().size)
+        offset = len(header)
+        memory.buf[:offset] = header
+        for chunk in _chunks(structure, instances):
+            memory.buf[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        return cls(memory.name, structure, memory)
+
+    def __reduce__(self):
+        # Workers attach again on their side
+        return (type(self), (self.name, self.structure))
+
+    def close(self):
+        super().close()
+        self._memory.close()
+
+    def unlink(self):
+        self._memory.unlink()
@@ -0,0 +1,61 @@
+"""
+Column validation of StructureArray, as strict as the scalar checks
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from structures import PositiveFloat, PositiveInteger, String, Structure, StructureArray
+
+
+class Stock(Structure):
+    name = String()
+    shares = PositiveInteger()
+    price = PositiveFloat(default=1.0)
+
+Stocks = StructureArray[Stock]
+
+
+def test_from_columns():
+    stocks = Stocks.from_columns(name=['GOOG', 'AAPL'], shares=[100, 50], price=[490.1, 92.5])
+    assert [tuple(vars(Stock(*row)).values()) for row in stocks.data.tolist()] == \
+        [('GOOG', 100, 490.1), ('AAPL', 50, 92.5)]
+    assert Stocks.from_columns(name=['GOOG'], shares=[1])['price'].tolist() == [1.0]
+    assert len(Stocks.from_columns(name=[], shares=[], price=[])) == 0
+
+
+@pytest.mark.parametrize('columns', [
+    dict(name=['GOOG', 7], shares=[1, 2], price=[1.0, 2.0]),
+    dict(name=['GOOG', 'AAPL'], shares=[1, 2.5], price=[1.0, 2.0]),
+    dict(name=['GOOG', 'AAPL'], shares=[1, 2], price=[490, 92.5]),
+    dict(name=['GOOG'], shares=np.array([1.0]), price=[1.0]),
+])
+def test_from_columns_types(columns):
+    # Each of these raises TypeError as Stock(...) would
+    with pytest.raises(TypeError, match='Expected'):
+        Stocks.from_columns(**columns)
+
+
+def test_from_columns_values():
+    with pytest.raises(ValueError, match='>= 0'):
+        Stocks.from_columns(name=['GOOG'], shares=[-1], price=[1.0])
+    with pytest.raises(ValueError, match='>= 0'):
+        Stocks.from_columns(name=['GOOG'], shares=np.array([1]), price=np.array([-1.0]))
+    with pytest.raises(ValueError, match='rows'):
+        Stocks.from_columns(name=['GOOG'], shares=[1, 2], price=[1.0])
+    with pytest.raises(TypeError, match='missing'):
+        Stocks.from_columns(name=['GOOG'])
+    with pytest.raises(TypeError, match='unexpected'):
+        Stocks.from_columns(name=['GOOG'], shares=[1], spam=[1])
+
+
+def test_row_views():
+    stocks = Stocks.from_rows([('GOOG', 100, 490.1)])
+    view = stocks[0]
+    view.shares = 10
+    assert stocks['shares'][0] == 10
+    with pytest.raises(TypeError):
+        view.price = 5
+    with pytest.raises(ValueError):
+        view.shares = -1
+    assert (view.shares, view.price) == (10, 490.1)
@@ -0,0 +1,105 @@
+"""
+The Sized, Regex, Range and OneOf checks, on values and on whole columns
+"""
+import pytest
+
+from structures import (OneOf, RangeFloat, RangeInteger, Regex, Sized, SizedRegexString,
+                        SizedString, Structure, Typed)
+
+
+class Order(Structure):
+    code = SizedString(maxlen=4)
+    symbol = SizedRegexString(maxlen=5, pat='[A-Z]+$')
+    shares = RangeInteger(low=1, high=100)
+    price = RangeFloat(low=0.0, high=1000.0)
+    side = OneOf(choices=['buy', 'sell'], default='buy')
+
+
+def test_good_values():
+    order = Order('ab', 'GOOG', 100, 0.0)
+    assert vars(order) == {'code': 'ab', 'symbol': 'GOOG', 'shares': 100, 'price': 0.0,
+                           'side': 'buy'}
+    order.side = 'sell'
+    order.code = 'abcd'
+    assert (order.side, order.code) == ('sell', 'abcd')
+
+
+GOOD = dict(code='ab', symbol='GOOG', shares=1, price=1.0, side='buy')
+
+@pytest.mark.parametrize('name, value, error, message', [
+    ('code', 'abcde', ValueError, 'Too long, max 4'),
+    ('symbol', 'goog', ValueError, 'must match'),
+    ('shares', 0, ValueError, 'between 1 and 100'),
+    ('shares', 101, ValueError, 'between 1 and 100'),
+    ('price', 1000.5, ValueError, 'between 0.0 and 1000.0'),
+    ('side', 'hold', ValueError, r"one of \['buy', 'sell'\]"),
+    ('shares', 1.0, TypeError, 'Expected'),
+])
+def test_bad_values(name, value, error, message):
+    # The same check in __init__, in __set__ and in check()
+    with pytest.raises(error, match=message):
+        Order(**dict(GOOD, **{name: value}))
+    order = Order(**GOOD)
+    with pytest.raises(error, match=message):
+        setattr(order, name, value)
+    assert getattr(order, name) == GOOD[name]
+    with pytest.raises(error, match=message):
+        getattr(Order, name).check(value)
+
+
+def test_sized_regex_string_order():
+    # String, then Sized, then Regex, in the order of the bases
+    assert SizedRegexString._check_lines == Typed.set_code() + Sized.set_code() + Regex.set_code()
+    with pytest.raises(TypeError, match='Expected'):
+        Order('ab', 12, 1, 1.0)
+    with pytest.raises(ValueError, match='Too long'):
+        Order('ab', 'goog12', 1, 1.0) # Too long and not matching, length comes first
+    with pytest.raises(ValueError, match='must match'):
+        Order('ab', 'go', 1, 1.0)
+
+
+def test_plain_constraints():
+    class Loose(Structure):
+        tag = Sized(maxlen=2)
+        word = Regex(pat='[a-z]+$')
+
+    assert vars(Loose([1, 2], 'ok')) == {'tag': [1, 2], 'word': 'ok'}
+    with pytest.raises(ValueError, match='Too long'):
+        Loose([1, 2, 3], 'ok')
+    with pytest.raises(ValueError, match='must match'):
+        Loose('ab', 'OK')
+
+
+def test_columns():
+    np = pytest.importorskip('numpy')
+    check = lambda name, column: getattr(Order, name).check_column(np.asarray(column))
+
+    check('code', np.array(['ab', 'abcd']))
+    check('code', np.array(['ab', 'abcd'], dtype='U10')) # Wider than maxlen, every value checked
+    check('code', np.array(['ab', 'abcd'], dtype=object))
+    with pytest.raises(ValueError, match='Too long'):
+        check('code', np.array(['ab', 'abcde'], dtype='U10'))
+    with pytest.raises(ValueError, match='Too long'):
+        check('code', np.array(['ab', 'abcde'], dtype=object))
+
+    check('symbol', np.array(['GOOG', 'AAPL'], dtype=object))
+    with pytest.raises(ValueError, match='must match'):
+        check('symbol', np.array(['GOOG', 'aapl'], dtype=object))
+    with pytest.raises(ValueError, match='Too long'):
+        check('symbol', np.array(['GOOGLE'], dtype=object))
+
+    check('shares', np.array([1, 100]))
+    with pytest.raises(ValueError, match='between'):
+        check('shares', np.array([0, 50]))
+    with pytest.raises(ValueError, match='between'):
+        check('shares', np.array([50, 101]))
+    with pytest.raises(TypeError, match='Expected'):
+        check('shares', np.array([1.0]))
+
+    check('price', np.array([0.0, 1000.0]))
+    with pytest.raises(ValueError, match='between'):
+        check('price', np.array([-0.5]))
+
+    check('side', np.array(['buy', 'sell', 'buy'], dtype=object))
+    with pytest.raises(ValueError, match='one of'):
+        check('side', np.array(['buy', 'hold'], dtype=object))
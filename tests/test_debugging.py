@@ -0,0 +1,92 @@
+"""
+Sampling and the TraceBuffer sink of structures.debugging
+"""
+import subprocess
+import sys
+import time
+
+import pytest
+
+from structures import debugging
+
+
+@pytest.fixture
+def traced():
+    # Debugging on with the events going to a list, put back afterwards
+    enabled, sink = debugging.debug_enabled, debugging.debug_sink
+    seen = []
+    debugging.set_debug(True, sink=seen.append)
+    yield seen
+    debugging.set_debug(enabled, sink=sink)
+
+
+def test_every(traced):
+    @debugging.debug(every=3)
+    def f(x):
+        return x
+
+    assert [f(n) for n in range(7)] == list(range(7))
+    assert traced == ['test_every.<locals>.f'] * 3 # Calls 1, 4 and 7
+
+
+def test_rate(traced, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+
+    @debugging.debug(rate=2, prefix='> ')
+    def f():
+        pass
+
+    for _ in range(5):
+        f()
+    assert len(traced) == 2
+    now[0] += 1 # Next second, two more
+    for _ in range(5):
+        f()
+    assert len(traced) == 4
+
+
+def test_every_and_rate(traced, monkeypatch):
+    monkeypatch.setattr(time, 'monotonic', lambda: 100.0)
+
+    @debugging.debugmethods(every=2, rate=3)
+    class C:
+        def f(self):
+            pass
+
+    for _ in range(10):
+        C().f()
+    assert traced == [C.f.__qualname__] * 3 # Of calls 1, 3, 5, 7 and 9
+
+
+def test_off():
+    enabled = debugging.debug_enabled
+    debugging.set_debug(False)
+    try:
+        def f():
+            pass
+        assert debugging.debug(f, every=2) is f
+    finally:
+        debugging.set_debug(enabled)
+
+
+def test_ring_buffer(tmp_path):
+    path = tmp_path / 'trace.log'
+    trace = debugging.TraceBuffer(str(path), size=3, interval=60)
+    for n in range(5):
+        trace('event %d' % n)
+    assert [msg for _, _, msg in trace.events] == ['event 2', 'event 3', 'event 4']
+    trace.close()
+    lines = path.read_text().splitlines()
+    assert [line.split(' ', 2)[2] for line in lines] == ['event 2', 'event 3', 'event 4']
+    assert not trace.events
+
+
+def test_trace_buffer_written_at_exit(tmp_path):
+    path = tmp_path / 'trace.log'
+    script = ('from structures.debugging import TraceBuffer\n'
+              'trace = TraceBuffer(%r, interval=60)\n'
+              'for n in range(8):\n'
+              '    trace("event %%d" %% n)\n' % str(path))
+    subprocess.run([sys.executable, '-c', script], check=True, timeout=30)
+    assert len(path.read_text().splitlines()) == 8
@@ -0,0 +1,62 @@
+"""
+to_bytes()/from_bytes() and pack_many()/unpack_many() of structures.packing
+"""
+import pytest
+
+from structures import Float, Integer, PositiveInteger, SizedString, Structure
+
+
+class Stock(Structure):
+    name = SizedString(maxlen=8)
+    shares = PositiveInteger()
+    price = Float()
+
+
+class SlotStock(Structure, slots=True):
+    name = SizedString(maxlen=8)
+    shares = PositiveInteger()
+    price = Float()
+
+
+class Point(Structure, frozen=True, intern=True):
+    x = Integer()
+    y = Integer()
+
+
+@pytest.mark.parametrize('cls', [Stock, SlotStock])
+def test_round_trip(cls):
+    stock = cls('GOOG', 100, 490.1)
+    data = stock.to_bytes()
+    assert len(data) == 8 + 8 + 8
+    copy = cls.from_bytes(data)
+    assert type(copy) is cls and (copy.name, copy.shares, copy.price) == ('GOOG', 100, 490.1)
+    copies = cls.unpack_many(cls.pack_many([stock, cls('AAPL', 50, 92.1)]))
+    assert [(s.name, s.shares, s.price) for s in copies] == [('GOOG', 100, 490.1),
+                                                            ('AAPL', 50, 92.1)]
+
+
+def test_from_bytes_checks():
+    data = Stock.trusted('GOOG', -1, 490.1).to_bytes()
+    with pytest.raises(ValueError, match='>= 0'):
+        Stock.from_bytes(data)
+    with pytest.raises(ValueError, match='24 bytes, got 23'):
+        Stock.from_bytes(data[:-1])
+    errors = []
+    assert Stock.unpack_many(data, errors) == []
+    assert [error.field for error in errors] == ['shares']
+
+
+def test_from_bytes_interns():
+    data = Point(1, 2).to_bytes()
+    assert Point.from_bytes(data) is Point.from_bytes(data) is Point.intern(Point(1, 2))
+
+
+@pytest.mark.parametrize('cls', [Stock, SlotStock])
+def test_pack_out_of_range(cls):
+    big = cls('GOOG', 2 ** 63, 490.1) # A valid Integer, too big for 8 bytes
+    with pytest.raises(ValueError, match="field 'shares'"):
+        big.to_bytes()
+    with pytest.raises(ValueError, match="record 1 field 'shares'"):
+        cls.pack_many([cls('AAPL', 50, 92.1), big])
+    with pytest.raises(ValueError, match='10 bytes of UTF-8, max 8'):
+        cls('ÉÉÉÉÉ', 1, 1.0).to_bytes()
@@ -0,0 +1,192 @@
+"""
+Tests of structures.core: the generated code and Descriptor.set_many()
+"""
+import pytest
+
+from structures import Float, Integer, PositiveFloat, PositiveInteger, String, Structure
+
+
+def test_fields_named_like_generated_locals():
+    class T(Structure):
+        amount = Float()
+        value = Float()
+        self = Integer()
+        instance = Integer()
+
+    t = T(1.0, 2.0, 3, 4)
+    assert vars(t) == {'amount': 1.0, 'value': 2.0, 'self': 3, 'instance': 4}
+    with pytest.raises(TypeError, match='float'):
+        T(1.0, 2, 3, 4)
+
+
+def test_fields_named_like_builtins():
+    from structures import OneOf, SizedString
+
+    class T(Structure):
+        name = SizedString(maxlen=4)
+        len = Integer()
+        isinstance = Integer(default=0)
+
+    class U(Structure):
+        isinstance = Integer()
+        sorted = OneOf(choices=['a', 'b'])
+        enumerate = Integer(default=1)
+
+    assert vars(T('ab', 3)) == {'name': 'ab', 'len': 3, 'isinstance': 0}
+    with pytest.raises(ValueError, match='Too long'):
+        T('abcde', 3)
+    assert vars(U(1, 'a')) == {'isinstance': 1, 'sorted': 'a', 'enumerate': 1}
+    with pytest.raises(ValueError, match='one of'):
+        U(1, 'c')
+    assert [vars(t) for t in T.from_rows([('ab', 3)])] == [{'name': 'ab', 'len': 3, 'isinstance': 0}]
+    errors = []
+    U.from_rows([(1, 'a'), ('x', 'a')], errors)
+    assert [(error.lineno, error.field) for error in errors] == [(2, 'isinstance')]
+
+
+def test_fields_starting_with_underscore_rejected():
+    with pytest.raises(TypeError, match='starts with _'):
+        class T(Structure):
+            _inst = Integer()
+
+
+def test_batches_with_fields_named_like_generated_locals():
+    class T(Structure):
+        amount = Float()
+        value = Float()
+        self = Integer()
+        instance = Integer()
+        cls = Integer()
+
+    expected = {'amount': 1.0, 'value': 2.0, 'self': 3, 'instance': 4, 'cls': 5}
+    assert [vars(t) for t in T.from_rows([(1.0, 2.0, 3, 4, 5)])] == [expected]
+    assert [vars(t) for t in T.from_rows([(1.0, 2.0, 3, 4, 5)], trusted=True)] == [expected]
+    assert vars(T.trusted(1.0, 2.0, 3, 4, 5)) == expected
+    packed = T.pack_many(T.from_rows([(1.0, 2.0, 3, 4, 5)]))
+    assert [vars(t) for t in T.unpack_many(packed)] == [expected]
+    errors = []
+    T.from_rows([(1.0, 2, 3, 4, 5)], errors)
+    assert [error.field for error in errors] == ['value']
+
+
+def test_debugattr_plain_class_default():
+    from structures import debugging
+
+    enabled, sink = debugging.debug_enabled, debugging.debug_sink
+    seen = []
+    debugging.set_debug(True, sink=seen.append)
+    try:
+        @debugging.debugattr(fields=['x'])
+        class P:
+            x = 0
+
+        p = P()
+        assert p.x == 0
+        p.x = 3
+        assert p.x == 3 and P.x == 0
+    finally:
+        debugging.set_debug(enabled, sink=sink)
+    assert seen == ['Get: x', 'Get: x']
+
+
+def test_frozen_views():
+    pytest.importorskip('numpy')
+    from structures import StructureArray
+
+    class FrozenPoint(Structure, frozen=True):
+        x = Float()
+        y = Float()
+
+    points = StructureArray[FrozenPoint].from_rows([(1.0, 2.0)])
+    view = points[0]
+    with pytest.raises(AttributeError):
+        view.x = 5.0
+    assert points.data['x'][0] == 1.0
+    assert view == FrozenPoint(1.0, 2.0) and hash(view) == hash(FrozenPoint(1.0, 2.0))
+    with pytest.raises(AttributeError):
+        FrozenPoint(1.0, 2.0).other = 5
+
+
+def test_row_views_to_bytes(tmp_path):
+    from structures import RecordFile, SizedString, write_records
+
+    class S(Structure, slots=True):
+        name = SizedString(maxlen=4)
+        count = Integer()
+
+    path = str(tmp_path / 's.rec')
+    write_records(path, S, [S('ab', 1)])
+    with RecordFile(path, S) as records:
+        view = records[0]
+        assert view.to_bytes() == S('ab', 1).to_bytes()
+        del view
+
+
+class Stock(Structure):
+    name = String()
+    shares = PositiveInteger()
+    price = PositiveFloat()
+
+
+class SlotStock(Structure, slots=True):
+    name = String()
+    shares = PositiveInteger()
+    price = PositiveFloat()
+
+
+@pytest.mark.parametrize('cls', [Stock, SlotStock])
+def test_set_many(cls):
+    stocks = [cls('GOOG', 100, 490.1), cls('AAPL', 50, 92.1)]
+    cls.price.set_many(stocks, [5.0, 6.0])
+    assert [s.price for s in stocks] == [5.0, 6.0]
+    with pytest.raises(ValueError, match='2 instances but 1 values'):
+        cls.price.set_many(stocks, [1.0])
+
+
+@pytest.mark.parametrize('cls', [Stock, SlotStock])
+def test_set_many_all_or_nothing(cls):
+    stocks = [cls('GOOG', 100, 490.1), cls('AAPL', 50, 92.1)]
+    with pytest.raises(ValueError, match='>= 0'):
+        cls.shares.set_many(stocks, [1, -1])
+    with pytest.raises(TypeError, match='Expected'):
+        cls.price.set_many(stocks, [1.0, 2])
+    assert [(s.shares, s.price) for s in stocks] == [(100, 490.1), (50, 92.1)]
+
+
+def test_set_many_array():
+    np = pytest.importorskip('numpy')
+    stocks = [Stock('GOOG', 100, 490.1), Stock('AAPL', 50, 92.1)]
+    Stock.shares.set_many(stocks, np.array([1, 2]))
+    assert [s.shares for s in stocks] == [1, 2]
+    assert type(stocks[0].shares) is int # Plain Python values, as an assignment stores
+    with pytest.raises(ValueError, match='>= 0'):
+        Stock.shares.set_many(stocks, np.array([3, -3]))
+    with pytest.raises(TypeError, match='Expected'):
+        Stock.shares.set_many(stocks, np.array([3.0, 4.0]))
+    assert [s.shares for s in stocks] == [1, 2]
+
+
+def test_set_many_views(tmp_path):
+    pytest.importorskip('numpy')
+    from structures import RecordFile, SizedString, StructureArray, write_records
+
+    array = StructureArray[Stock].from_rows([('GOOG', 100, 490.1), ('AAPL', 50, 92.1)])
+    views = list(array)
+    Stock.price.set_many(views, [5.0, 6.0])
+    assert array['price'].tolist() == [5.0, 6.0] and views[0].price == 5.0
+    with pytest.raises(ValueError):
+        Stock.price.set_many(views, [7.0, -7.0])
+    assert array['price'].tolist() == [5.0, 6.0]
+
+    class Packed(Structure):
+        name = SizedString(maxlen=4)
+        shares = PositiveInteger()
+
+    path = str(tmp_path / 'p.rec')
+    write_records(path, Packed, [Packed('GOOG', 1)])
+    plain = Packed('AAPL', 2)
+    with RecordFile(path, Packed) as records:
+        with pytest.raises(AttributeError, match='read only'):
+            Packed.shares.set_many([plain, records[0]], [3, 4])
+        assert records[0].shares == 1
+    assert plain.shares == 2
@@ -0,0 +1,374 @@
+"""
+trend.py with local stand-ins for the network
+"""
+from datetime import date, timedelta
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+trend = pytest.importorskip('trend') # Also needs pandas_datareader, matplotlib and sklearn
+
+
+def day(text):
+    return date.fromisoformat(text)
+
+
+class Fetcher:
+    # Stands in for web.DataReader: a Close of day-of-month on business days, every call logged
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, symbol, source, start, end):
+        self.calls.append((symbol, trend._day(start), trend._day(end)))
+        days = pd.bdate_range(start, end, name='Date')
+        return pd.DataFrame({'Close': [float(d.day) for d in days],
+                             'Volume': [d.day * 100 for d in days]}, index=days)
+
+
+@pytest.fixture
+def fetcher():
+    return Fetcher()
+
+
+@pytest.fixture
+def cache(tmp_path, fetcher):
+    return trend.DataCache(str(tmp_path / 'cache.sqlite'), fetcher)
+
+
+def test_get_fetches_once(cache, fetcher):
+    df = cache.get('AAPL', 'stooq', '2020-01-01', '2020-01-31')
+    assert fetcher.calls == [('AAPL', day('2020-01-01'), day('2020-01-31'))]
+    assert len(df) == 23 and df.index[0] == pd.Timestamp('2020-01-01')
+    again = cache.get('AAPL', 'stooq', '2020-01-06', '2020-01-20')
+    assert len(fetcher.calls) == 1
+    assert again.equals(df.loc['2020-01-06':'2020-01-20'])
+
+
+def test_missing_gaps(cache, fetcher):
+    cache.store('AAPL', 'stooq', fetcher('AAPL', 'stooq', '2020-01-05', '2020-01-10'),
+                '2020-01-05', '2020-01-10')
+    cache.store('AAPL', 'stooq', fetcher('AAPL', 'stooq', '2020-01-15', '2020-01-20'),
+                '2020-01-15', '2020-01-20')
+    assert cache.missing('AAPL', 'stooq', '2020-01-01', '2020-01-31') == [
+        (day('2020-01-01'), day('2020-01-04')),
+        (day('2020-01-11'), day('2020-01-14')),
+        (day('2020-01-21'), day('2020-01-31'))]
+    assert cache.missing('AAPL', 'stooq', '2020-01-06', '2020-01-09') == []
+    assert cache.missing('MSFT', 'stooq', '2020-01-06', '2020-01-09') == [
+        (day('2020-01-06'), day('2020-01-09'))]
+    assert cache.missing('AAPL', 'yahoo', '2020-01-06', '2020-01-09') == [
+        (day('2020-01-06'), day('2020-01-09'))]
+
+
+def test_missing_overlapping_ranges(cache, fetcher):
+    for start, end in [('2020-01-01', '2020-01-10'), ('2020-01-05', '2020-01-15'),
+                       ('2020-01-07', '2020-01-08')]:
+        cache.store('AAPL', 'stooq', fetcher('AAPL', 'stooq', start, end), start, end)
+    assert cache.missing('AAPL', 'stooq', '2020-01-01', '2020-01-20') == [
+        (day('2020-01-16'), day('2020-01-20'))]
+    fetcher.calls.clear()
+    cache.get('AAPL', 'stooq', '2019-12-30', '2020-01-20')
+    assert fetcher.calls == [('AAPL', day('2019-12-30'), day('2019-12-31')),
+                             ('AAPL', day('2020-01-16'), day('2020-01-20'))]
+    assert cache.missing('AAPL', 'stooq', '2019-12-30', '2020-01-20') == []
+
+
+def test_today_never_marked(cache, fetcher):
+    today = date.today()
+    cache.get('AAPL', 'stooq', today - timedelta(days=3), today)
+    assert cache.missing('AAPL', 'stooq', today - timedelta(days=3), today) == [(today, today)]
+    cache.get('AAPL', 'stooq', today - timedelta(days=3), today)
+    assert fetcher.calls[1] == ('AAPL', today, today)
+
+
+def test_load_round_trip(cache):
+    df = pd.DataFrame({'Open': [1.5, 2.5], 'Close': [2.0, 3.0], 'Volume': [100, 200]},
+                      index=pd.DatetimeIndex(['2020-01-02', '2020-01-03'], name='Date'))
+    cache.store('AAPL', 'stooq', df, '2020-01-01', '2020-01-05')
+    loaded = cache.load('AAPL', 'stooq', '2020-01-01', '2020-01-05')
+    pd.testing.assert_frame_equal(loaded, df)
+    assert cache.load('AAPL', 'stooq', '2020-01-03', '2020-01-03').index.tolist() == \
+        [pd.Timestamp('2020-01-03')]
+    assert cache.last_date('AAPL', 'stooq') == day('2020-01-03')
+    assert cache.last_date('MSFT', 'stooq') is None
+    # Stored again, the rows are replaced and not doubled
+    cache.store('AAPL', 'stooq', df * 2, '2020-01-01', '2020-01-05')
+    pd.testing.assert_frame_equal(cache.load('AAPL', 'stooq', '2020-01-01', '2020-01-05'), df * 2)
+
+
+def test_reopened(tmp_path, fetcher):
+    path = str(tmp_path / 'cache.sqlite')
+    trend.DataCache(path, fetcher).get('AAPL', 'stooq', '2020-01-01', '2020-01-10')
+    cache = trend.DataCache(path, fetcher)
+    assert len(cache.get('AAPL', 'stooq', '2020-01-01', '2020-01-10')) == 8
+    assert len(fetcher.calls) == 1
+    plan = cache._db.execute('EXPLAIN QUERY PLAN SELECT start, end FROM fetched '
+                             'WHERE source = ? AND symbol = ? AND end >= ? AND start <= ?',
+                             ('stooq', 'AAPL', '2020-01-01', '2020-01-10')).fetchall()
+    assert 'fetched_range' in str(plan)
+
+
+def stock(cache, days=30, source='stooq', **fields):
+    s = trend.Stock(source, days, cache=cache)
+    for name, value in fields.items():
+        setattr(s, name, value)
+    return s
+
+
+def test_get_data(cache, fetcher):
+    df, = stock(cache, symbol='aapl').get_data
+    assert len(fetcher.calls) == 1 and fetcher.calls[0][0] == 'AAPL'
+    assert list(df.columns) == ['Close', 'Volume']
+    df, = stock(cache, symbols=['aapl', 'msft']).get_data
+    assert set(df.columns) == {(column, symbol) for column in ('Close', 'Volume')
+                               for symbol in ('AAPL', 'MSFT')}
+    today = date.today()
+    # AAPL was cached but for today
+    assert sorted(fetcher.calls[1:]) == [('AAPL', today, today),
+                                         ('MSFT', today - timedelta(days=30), today)]
+
+
+class Flaky(Fetcher):
+    # Fails with error the first failures calls for each symbol in fail
+    def __init__(self, fail=(), failures=1, error=ConnectionError):
+        super().__init__()
+        self.fail = dict.fromkeys(fail, failures)
+        self.error = error
+
+    def __call__(self, symbol, source, start, end):
+        if self.fail.get(symbol):
+            self.fail[symbol] -= 1
+            self.calls.append((symbol, None, None))
+            raise self.error(symbol)
+        return super().__call__(symbol, source, start, end)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(trend.time, 'sleep', slept.append)
+    return slept
+
+
+def test_fetch_many(cache, fetcher):
+    fetched = dict(stock(cache, symbols=['aapl', 'msft', 'goog']).fetch_many(workers=2))
+    assert sorted(fetched) == ['AAPL', 'GOOG', 'MSFT']
+    assert all(len(df) for df in fetched.values())
+    assert dict(stock(cache).fetch_many('ibm', workers=2)).keys() == {'IBM'}
+
+
+def test_fetch_many_retries(tmp_path, sleeps):
+    flaky = Flaky(['AAPL'], failures=2)
+    cache = trend.DataCache(str(tmp_path / 'cache.sqlite'), flaky)
+    fetched = dict(stock(cache).fetch_many(['aapl'], retries=3, backoff=0.5))
+    assert len(fetched['AAPL']) and sleeps == [0.5, 1.0]
+    assert [symbol for symbol, _, _ in flaky.calls] == ['AAPL'] * 3
+
+
+def test_fetch_many_gives_up(tmp_path, sleeps):
+    cache = trend.DataCache(str(tmp_path / 'cache.sqlite'), Flaky(['AAPL'], failures=10))
+    with pytest.raises(ConnectionError):
+        dict(stock(cache).fetch_many(['aapl'], retries=3))
+    assert sleeps == [1.0, 2.0, 4.0]
+
+
+def test_fetch_many_no_retry_on_bad_symbol(tmp_path, sleeps):
+    flaky = Flaky(['NOPE'], error=KeyError)
+    cache = trend.DataCache(str(tmp_path / 'cache.sqlite'), flaky)
+    with pytest.raises(KeyError):
+        dict(stock(cache).fetch_many(['nope']))
+    assert sleeps == [] and len(flaky.calls) == 1
+
+
+def test_fetch_many_errors(tmp_path, sleeps):
+    cache = trend.DataCache(str(tmp_path / 'cache.sqlite'), Flaky(['BAD'], error=KeyError))
+    errors = []
+    fetched = dict(stock(cache).fetch_many(['aapl', 'bad', 'msft'], errors=errors))
+    assert sorted(fetched) == ['AAPL', 'MSFT']
+    assert [(symbol, type(e)) for symbol, e in errors] == [('BAD', KeyError)]
+
+
+def test_fetch_many_rate_limit(cache, fetcher, sleeps, monkeypatch):
+    monkeypatch.setattr(trend.time, 'monotonic', lambda: 1000.0)
+    monkeypatch.setitem(trend.Stock.rate_limits, 'stooq', 4)
+    monkeypatch.setattr(trend.Stock, '_limiters', {})
+    dict(stock(cache).fetch_many(['a', 'b', 'c'], workers=1))
+    assert sleeps == [0.25, 0.5] # The clock stands still, each call a quarter second later
+    del sleeps[:]
+    dict(stock(cache, days=10).fetch_many(['a', 'b', 'c'], workers=1))
+    assert len(fetcher.calls) == 6 # Only today again, but still counted
+    assert sleeps == [0.75, 1.0, 1.25]
+
+
+def test_rate_limit(sleeps, monkeypatch):
+    now = [10.0]
+    monkeypatch.setattr(trend.time, 'monotonic', lambda: now[0])
+    limit = trend.RateLimit(2)
+    limit.wait()
+    limit.wait()
+    now[0] += 2 # Idle long enough, no wait
+    limit.wait()
+    limit.wait()
+    assert sleeps == [0.5, 0.5]
+
+
+def test_fetch_many_stops_early(cache):
+    started = []
+    def slow(symbol, source, start, end):
+        started.append(symbol)
+        trend.time.sleep(0.05)
+        return Fetcher()(symbol, source, start, end)
+    cache.fetcher = slow
+    symbols = ['S%d' % n for n in range(10)]
+    for symbol, df in stock(cache).fetch_many(symbols, workers=2):
+        break
+    assert len(started) < len(symbols)
+
+
+def test_iter_data_windows(cache, fetcher):
+    s = stock(cache, days=10, symbols=['aapl', 'msft'])
+    today = date.today()
+    chunks = list(s.iter_data(chunk_days=4))
+    windows = [(today - timedelta(days=10), today - timedelta(days=7)),
+               (today - timedelta(days=6), today - timedelta(days=3)),
+               (today - timedelta(days=2), today)]
+    assert fetcher.calls == [(symbol, start, end) for symbol in ('AAPL', 'MSFT')
+                             for start, end in windows]
+    assert [symbol for symbol, _ in chunks] == sorted(symbol for symbol, _ in chunks)
+    for symbol in ('AAPL', 'MSFT'):
+        frames = [df for name, df in chunks if name == symbol]
+        assert len(frames) == 3
+        days = pd.concat(frames).index
+        assert days.is_monotonic_increasing and days.is_unique
+        assert list(days) == list(pd.bdate_range(windows[0][0], today))
+
+
+def test_iter_data_one_day_chunks(cache, fetcher):
+    list(stock(cache, days=2, symbol='aapl').iter_data(chunk_days=1))
+    today = date.today()
+    assert [(start, end) for _, start, end in fetcher.calls] == \
+        [(today - timedelta(days=n), today - timedelta(days=n)) for n in (2, 1, 0)]
+
+
+@pytest.mark.parametrize('chunk_days', [0, -1])
+def test_iter_data_chunk_days(cache, chunk_days):
+    with pytest.raises(ValueError, match='chunk_days'):
+        next(stock(cache, symbol='aapl').iter_data(chunk_days=chunk_days))
+
+
+def test_iter_data_retries_without_cache(monkeypatch, sleeps):
+    flaky = Flaky(['AAPL'])
+    monkeypatch.setattr(trend.web, 'DataReader', flaky)
+    chunks = list(stock(None, days=6, symbol='aapl').iter_data(chunk_days=7))
+    assert len(chunks) == 1 and sleeps == [1.0]
+
+
+def rows(cache):
+    return cache._db.execute('SELECT * FROM prices ORDER BY source, symbol, date').fetchall()
+
+
+def test_update(cache, fetcher):
+    s = stock(cache, days=30, symbols=['aapl'])
+    today = date.today()
+    first = s.update()
+    assert fetcher.calls == [('AAPL', today - timedelta(days=30), today)]
+    assert first == {'AAPL': len(pd.bdate_range(today - timedelta(days=30), today))}
+    stored = rows(cache)
+    last = cache.last_date('AAPL', 'stooq')
+
+    s.update()
+    # Only from the last stored date on, and storing it again changes nothing
+    assert fetcher.calls[1] == ('AAPL', last, today)
+    assert rows(cache) == stored
+
+    # A new symbol gets the whole window, the known one just the tail
+    s.update(['aapl', 'msft'])
+    assert fetcher.calls[2:] == [('AAPL', last, today),
+                                 ('MSFT', today - timedelta(days=30), today)]
+
+
+def test_update_needs_cache():
+    with pytest.raises(ValueError, match='cache'):
+        stock(None, symbol='aapl').update()
+
+
+class Directory:
+    # Stands in for web.get_nasdaq_symbols, counting downloads
+    def __init__(self):
+        self.downloads = 0
+
+    def __call__(self):
+        self.downloads += 1
+        return pd.DataFrame({'Security Name': ['Apple', 'Applied', 'Amazon', 'SPDR', 'IBM'],
+                             'Listing Exchange': ['Q', 'Q', 'Q', 'P', 'N'],
+                             'ETF': [False, False, False, True, False]},
+                            index=pd.Index(['AAPL', 'AAOI', 'AMZN', 'SPY', 'IBM'],
+                                           name='NASDAQ Symbol'))
+
+
+@pytest.fixture
+def directory():
+    return Directory()
+
+
+@pytest.fixture
+def index(tmp_path, directory):
+    return trend.SymbolIndex(str(tmp_path / 'cache' / 'symbols.pkl'), ttl=100, loader=directory)
+
+
+def test_symbol_index_lookups(index, directory):
+    assert directory.downloads == 0 # Nothing until the first lookup
+    assert len(index) == 5
+    assert 'aapl' in index and 'MSFT' not in index
+    assert index.get('ibm')['Security Name'] == 'IBM'
+    with pytest.raises(KeyError):
+        index.get('msft')
+    assert index.prefix('aa') == ['AAOI', 'AAPL']
+    assert index.prefix('A') == ['AAOI', 'AAPL', 'AMZN']
+    assert index.prefix('Z') == [] and index.prefix('') == sorted(index.frame.index)
+    assert index.select(exchange='Q') == ['AAOI', 'AAPL', 'AMZN']
+    assert index.select(exchange='X') == []
+    assert index.select(etf=True) == ['SPY']
+    assert index.select(exchange='Q', etf=False) == ['AAOI', 'AAPL', 'AMZN']
+    assert index.select(etf=False) == ['AAOI', 'AAPL', 'AMZN', 'IBM']
+    assert directory.downloads == 1
+
+
+def test_symbol_index_ttl(index, directory, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(trend.time, 'monotonic', lambda: now[0])
+    assert 'AAPL' in index and directory.downloads == 1
+    # Another process within ttl reads the file
+    other = trend.SymbolIndex(index.path, ttl=100, loader=directory)
+    assert len(other) == 5 and directory.downloads == 1
+    now[0] += 50
+    assert 'AAPL' in index and directory.downloads == 1
+    # Expired, and so is the file
+    now[0] += 51
+    old = trend.time.time() - 200
+    trend.os.utime(index.path, (old, old))
+    assert 'AAPL' in index and directory.downloads == 2
+    index.refresh(force=True)
+    assert directory.downloads == 3
+
+
+def test_symbol_index_broken_file(index, directory):
+    trend.os.makedirs(trend.os.path.dirname(index.path))
+    with open(index.path, 'wb') as f:
+        f.write(b'\x80\x04half a pickle')
+    assert len(index) == 5 and directory.downloads == 1
+    assert len(trend.SymbolIndex(index.path, loader=directory)) == 5
+    assert directory.downloads == 1 # Written again, whole this time
+    assert not [name for name in trend.os.listdir(trend.os.path.dirname(index.path))
+                if name.endswith('.tmp')]
+
+
+def test_get_data_nasdaq(index, directory, monkeypatch):
+    monkeypatch.setattr(trend.Stock, 'symbol_index', index)
+    df, = trend.Stock('nasdaq').get_data
+    assert len(df) == 5
+    df, = stock(None, symbols=['spy', 'ibm'], source='nasdaq').get_data
+    assert list(df.index) == ['SPY', 'IBM']
+    with pytest.raises(KeyError):
+        list(stock(None, symbol='msft', source='nasdaq').get_data)
+    assert directory.downloads == 1
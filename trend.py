@@ -1,9 +1,17 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import pandas_datareader.data as web
 from sklearn.cluster import KMeans
-from datetime import datetime, timedelta
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
 from inspect import Parameter, Signature
 
 
@@ -19,6 +27,246 @@ class StructMeta(type):
                 Parameter(v, Parameter.POSITIONAL_OR_KEYWORD) for v in names
                 )
         
+def _day(value):
+    # date out of a date, datetime, Timestamp or 'YYYY-MM-DD'
+    return pd.Timestamp(value).date()
+
+
+class DataCache:
+    """
+    Market data kept on disk in SQLite, one row per (source, symbol, date), so only the
+    dates never fetched before go to the network.
+    - path: SQLite file, created if missing
+    - fetcher: called as fetcher(symbol, source, start, end) for the missing ranges, web.DataReader
+      by default. Anything returning a DataFrame indexed by date will do, e.g. a local stand-in in tests
+    """
+    def __init__(self, path='market_data.sqlite', fetcher=None):
+        self.path = path
+        self.fetcher = fetcher or web.DataReader
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock() # Fetches run in parallel, the database one at a time
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS prices '
+                             '(source TEXT, symbol TEXT, date TEXT, data TEXT, '
+                             'PRIMARY KEY (source, symbol, date))')
+            # Ranges already asked for, holidays and weekends have no rows but aren't missing
+            self._db.execute('CREATE TABLE IF NOT EXISTS fetched '
+                             '(source TEXT, symbol TEXT, start TEXT, end TEXT)')
+            # missing() runs on every get(), don't scan the ranges of every other symbol
+            self._db.execute('CREATE INDEX IF NOT EXISTS fetched_range '
+                             'ON fetched (source, symbol, start)')
+
+    def missing(self, symbol, source, start, end):
+        """
+        (start, end) date ranges between start and end that were never fetched
+        """
+        start, end = _day(start), _day(end)
+        with self._lock:
+            rows = self._db.execute('SELECT start, end FROM fetched '
+                                    'WHERE source = ? AND symbol = ? AND end >= ? AND start <= ? '
+                                    'ORDER BY start',
+                                    (source, symbol, start.isoformat(), end.isoformat())).fetchall()
+        gaps = []
+        for done_start, done_end in rows:
+            done_start, done_end = _day(done_start), _day(done_end)
+            if done_start > start:
+                gaps.append((start, done_start - timedelta(days=1)))
+            start = max(start, done_end + timedelta(days=1))
+        if start <= end:
+            gaps.append((start, end))
+        return gaps
+
+    def get(self, symbol, source, start, end, fetcher=None):
+        """
+        History of symbol from start to end, fetching only the missing ranges
+        (with fetcher instead of self.fetcher if given)
+        """
+        fetcher = fetcher or self.fetcher
+        for gap_start, gap_end in self.missing(symbol, source, start, end):
+            self.store(symbol, source, fetcher(symbol, source, gap_start, gap_end),
+                       gap_start, gap_end)
+        return self.load(symbol, source, start, end)
+
+    def store(self, symbol, source, df, start, end):
+        """
+        Merge the rows of df into the cache and mark start to end as fetched. Today is never
+        marked, its numbers change until the close
+        """
+        rows = [(source, symbol, _day(day).isoformat(), json.dumps(record))
+                for day, record in zip(df.index, df.to_dict('records'))]
+        end = min(_day(end), date.today() - timedelta(days=1))
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?)', rows)
+            if _day(start) <= end:
+                self._db.execute('INSERT INTO fetched VALUES (?, ?, ?, ?)',
+                                 (source, symbol, _day(start).isoformat(), end.isoformat()))
+
+    def last_date(self, symbol, source):
+        """
+        Date of the newest row stored for symbol, None if there are none
+        """
+        with self._lock:
+            day, = self._db.execute('SELECT max(date) FROM prices WHERE source = ? AND symbol = ?',
+                                    (source, symbol)).fetchone()
+        return None if day is None else _day(day)
+
+    def load(self, symbol, source, start, end):
+        """
+        Cached history of symbol from start to end, without fetching anything
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT date, data FROM prices '
+                                    'WHERE source = ? AND symbol = ? AND date BETWEEN ? AND ? '
+                                    'ORDER BY date',
+                                    (source, symbol, _day(start).isoformat(),
+                                     _day(end).isoformat())).fetchall()
+        days, records = [], []
+        for day, data in rows:
+            days.append(day)
+            records.append(json.loads(data))
+        return pd.DataFrame(records, index=pd.DatetimeIndex(days, name='Date'))
+
+
+class SymbolIndex:
+    """
+    The NASDAQ symbol directory, kept on disk for ttl seconds and indexed in memory,
+    so lookups don't download and parse the whole directory every time.
+    - path: pickle file of the directory, ~/.cache/trend/nasdaq_symbols.pkl by default
+    - ttl: seconds before it gets downloaded again
+    - loader: web.get_nasdaq_symbols by default, anything giving the same DataFrame will do
+    Nothing is read until the first lookup.
+    """
+    def __init__(self, path=None, ttl=24 * 3600, loader=None):
+        # Not the working directory, the index is shared by every script using it
+        self.path = path or os.path.join(os.path.expanduser('~'), '.cache', 'trend',
+                                         'nasdaq_symbols.pkl')
+        self.ttl = ttl
+        self.loader = loader or web.get_nasdaq_symbols
+        self._expires = 0.0
+
+    def refresh(self, force=False):
+        """
+        Download the directory unless the file on disk is younger than ttl, then index it
+        """
+        try:
+            age = time.time() - os.path.getmtime(self.path)
+        except OSError:
+            age = None
+        df = None
+        if not force and age is not None and age <= self.ttl:
+            try:
+                df = pd.read_pickle(self.path)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+                pass # Broken file, download it again
+        if df is None:
+            df = self.loader()
+            self._save(df)
+            age = 0
+        self._index(df)
+        self._expires = time.monotonic() + self.ttl - age
+
+    def _save(self, df):
+        # Write then rename, other processes reading the file never see half of it
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            df.to_pickle(tmp)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass # Still indexed in memory, the next process downloads it again
+
+    def _index(self, df):
+        self._frame = df
+        self._rows = dict(zip(df.index, df.to_dict('records')))
+        self._sorted = sorted(self._rows)
+        self._exchanges = {}
+        for symbol, exchange in zip(df.index, df['Listing Exchange']):
+            self._exchanges.setdefault(exchange, set()).add(symbol)
+        self._etfs = set(df.index[df['ETF'].astype(bool)])
+
+    def _fresh(self):
+        if time.monotonic() >= self._expires:
+            self.refresh()
+        return self
+
+    @property
+    def frame(self):
+        # The whole directory, indexed by NASDAQ symbol
+        return self._fresh()._frame
+
+    def __len__(self):
+        return len(self._fresh()._rows)
+
+    def __contains__(self, symbol):
+        return symbol.upper() in self._fresh()._rows
+
+    def get(self, symbol):
+        """
+        Directory entry of symbol as a dict, KeyError if it isn't listed
+        """
+        return self._fresh()._rows[symbol.upper()]
+
+    def prefix(self, prefix):
+        """
+        Symbols starting with prefix, in order
+        """
+        keys = self._fresh()._sorted
+        prefix = prefix.upper()
+        # Everything starting with prefix sorts between prefix and prefix + the last code point
+        return keys[bisect_left(keys, prefix):bisect_left(keys, prefix + '\U0010ffff')]
+
+    def select(self, exchange=None, etf=None):
+        """
+        Symbols listed on exchange (the directory's Listing Exchange code, e.g. 'Q' for
+        NASDAQ and 'N' for NYSE) and/or being (etf=True) or not being (etf=False) ETFs
+        """
+        self._fresh()
+        symbols = set(self._rows) if exchange is None else self._exchanges.get(exchange, set())
+        if etf is not None:
+            symbols = symbols & self._etfs if etf else symbols - self._etfs
+        return sorted(symbols)
+
+
+class RateLimit:
+    """
+    At most rate calls a second, shared by every thread calling wait()
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Worth trying again: connection errors, timeouts and the HTTP errors of requests and
+# pandas_datareader are all OSError. Anything else (an unknown symbol, bad data) fails
+# the same way every time
+TRANSIENT_ERRORS = (OSError,)
+
+
+def _retrying(fetcher, retries, backoff, limit=None):
+    # fetcher tried again up to retries times on TRANSIENT_ERRORS, waiting backoff,
+    # 2*backoff, ... seconds in between
+    def fetch(*args):
+        for attempt in range(retries + 1):
+            if limit is not None:
+                limit.wait()
+            try:
+                return fetcher(*args)
+            except TRANSIENT_ERRORS:
+                if attempt == retries:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+    return fetch
+
+
 class Stock(metaclass=StructMeta):
     """
     Class object to extract data and perform some analysis.
@@ -26,37 +274,148 @@ class Stock(metaclass=StructMeta):
     - days: How many days of data you want to analyse
     - source: this are the datasources declared in https://github.com/pydata/pandas-datareader/blob/master/pandas_datareader/data.py
     - Construct issue with keyword args: https://stackoverflow.com/questions/8187082/how-can-you-set-class-attributes-from-variable-arguments-kwargs-in-python
+    - cache: DataCache to read through, None fetches everything every time
+    - rate_limits: calls a second allowed per source in fetch_many, e.g. Stock.rate_limits['stooq'] = 5
+    - symbol_index: SymbolIndex of the NASDAQ directory shared by all the instances, source='nasdaq'
     """
     _fields = []
-    def __init__(self, source, days=0, *args, **kwargs):
+    symbol_index = SymbolIndex()
+    rate_limits = {}
+    _limiters = {}
+    def __init__(self, source, days=0, *args, cache=None, **kwargs):
         self.days = days
         self.source = source
+        self.cache = cache
         self._today = datetime.today()
         self._start_date = self._today-timedelta(days=self.days)
             
+    def _read(self, symbols, start, end, fetcher=None):
+        # web.DataReader (or fetcher), through the cache when there is one
+        if self.cache is None:
+            return (fetcher or web.DataReader)(symbols, self.source, start, end)
+        if isinstance(symbols, str):
+            return self.cache.get(symbols, self.source, start, end, fetcher)
+        # Same (attribute, symbol) columns as DataReader gives for a list
+        return pd.concat({symbol: self.cache.get(symbol, self.source, start, end, fetcher)
+                          for symbol in symbols}, axis=1).swaplevel(axis=1)
+
+    def _fetcher(self, retries, backoff):
+        # The cache's fetcher or web.DataReader, retried and held to rate_limits
+        rate = self.rate_limits.get(self.source)
+        if rate:
+            limit = self._limiters.setdefault((self.source, rate), RateLimit(rate))
+        else:
+            limit = None
+        fetcher = self.cache.fetcher if self.cache is not None else web.DataReader
+        return _retrying(fetcher, retries, backoff, limit)
+
+    def _symbols(self, symbols):
+        # List of upper case symbols, self.symbol or self.symbols by default
+        if symbols is None:
+            symbols = getattr(self, 'symbol', None) or self.symbols
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        return [symbol.upper() for symbol in symbols]
+
+    def fetch_many(self, symbols=None, workers=8, retries=3, backoff=1.0, errors=None):
+        """
+        Fetch the history of every symbol over the days window with workers threads,
+        yielding (symbol, df) as each one completes.
+        - symbols: symbol or list of them, self.symbol or self.symbols by default
+        - retries: fetches failing with one of TRANSIENT_ERRORS are tried again that many
+          times, waiting backoff seconds then doubling it each time
+        - errors: list getting (symbol, exception) for symbols failing every try,
+          without it the first failure is raised and the fetches left are cancelled
+        Cached dates don't count against rate_limits, only the calls going out do.
+        """
+        start = self._start_date.strftime('%Y-%m-%d')
+        end = self._today.strftime('%Y-%m-%d')
+        fetcher = self._fetcher(retries, backoff)
+        with ThreadPoolExecutor(workers) as pool:
+            futures = {pool.submit(self._read, symbol, start, end, fetcher): symbol
+                       for symbol in self._symbols(symbols)}
+            try:
+                for future in as_completed(futures):
+                    symbol = futures[future]
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        if errors is None:
+                            raise
+                        errors.append((symbol, e))
+                        continue
+                    yield symbol, df
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def iter_data(self, chunk_days=365, symbols=None, retries=3, backoff=1.0):
+        """
+        Stream the history over the days window as (symbol, df), one symbol at a time and
+        chunk_days at a time oldest first, so only one chunk is ever held. Empty chunks
+        (holidays) are skipped.
+        - symbols: symbol or list of them, self.symbol or self.symbols by default
+        - retries, backoff: as in fetch_many, which rate_limits also applies to
+        """
+        if chunk_days < 1:
+            raise ValueError('chunk_days must be at least 1, got %r' % chunk_days)
+        fetcher = self._fetcher(retries, backoff)
+        for symbol in self._symbols(symbols):
+            start = self._start_date
+            while start <= self._today:
+                end = min(start + timedelta(days=chunk_days - 1), self._today)
+                df = self._read(symbol, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'),
+                                fetcher)
+                if len(df):
+                    yield symbol, df
+                start = end + timedelta(days=1)
+
+    def update(self, symbols=None, retries=3, backoff=1.0):
+        """
+        Daily refresh of the cache: each symbol is fetched from the last date stored for it
+        to today, a new one gets the whole days window. The last stored date is fetched
+        again in case it was stored before the close, rows are replaced by date so running
+        it twice changes nothing. Gives {symbol: rows fetched}.
+        """
+        if self.cache is None:
+            raise ValueError('update() needs a cache to keep the history in')
+        fetcher = self._fetcher(retries, backoff)
+        today = self._today.date()
+        fetched = {}
+        for symbol in self._symbols(symbols):
+            start = self.cache.last_date(symbol, self.source) or self._start_date.date()
+            df = fetcher(symbol, self.source, start, today)
+            self.cache.store(symbol, self.source, df, start, today)
+            fetched[symbol] = len(df)
+        return fetched
+
     @property
     def get_data(self):
         if self.source == 'nasdaq':
-            df = web.get_nasdaq_symbols
-        self._start_date = self._start_date.strftime('%Y-%m-%d')
-        self._today = self._today.strftime('%Y-%m-%d')
-        if self.symbol:
-            assert hasattr(self, 'self.symbol')
+            # The directory itself (what DataReader gives for source='nasdaq'), from the
+            # index, only the entries of self.symbol(s) if set, KeyError if one isn't listed
+            df = self.symbol_index.frame
+            if getattr(self, 'symbol', None) or getattr(self, 'symbols', None):
+                df = df.loc[self._symbols(None)]
+            yield df
+            return
+        # Kept as dates, the next call needs them again
+        start = self._start_date.strftime('%Y-%m-%d')
+        end = self._today.strftime('%Y-%m-%d')
+        if getattr(self, 'symbol', None):
             self.symbol = self.symbol.upper()
-            df = web.DataReader(
+            df = self._read(
                     self.symbol,
-                    self.source,
-                    self._start_date,
-                    self._today)
+                    start,
+                    end)
         else:
-            df = web.DataReader(
-                    self.symbols,
-                    self.source,
-                    self._start_date,
-                    self._today)
-            yield df
-        return df
+            df = self._read(
+                    self._symbols(self.symbols),
+                    start,
+                    end)
+        yield df
 
-aapl = Stock(source='nasdaq')
-for _ in aapl.get_data:
-    print(_)
+if __name__ == '__main__':
+    aapl = Stock(source='nasdaq')
+    for _ in aapl.get_data:
+        print(_)